@@ -13,6 +13,7 @@ from optimization.css import *  # pycharm pliszz
 from optimization.ants import * # pycharm pliss
 from optimization.cuckoo import * # pycharm pliss
 from optimization.gso import * # pycharm pliss
+from optimization.trajectory import TrajectoryReader
 from pmath.functions.elementary_functions import *  # pycharm plis
 from pmath.rndgen.advanced import * # pycharm plis
 from pmath.rndgen.pygen import * # pycharm plis
@@ -181,6 +182,10 @@ class SuperOkienkoAsi:
         self.cases.append((nazwa, punkty))
         self.refresh_combobox()
 
+    def add_trajectory(self, nazwa: str, path: str):
+        """ Adds trajectory written by BinaryTrajectorySink, frames are read from disk when drawn """
+        self.add_result(nazwa, TrajectoryReader(path))
+
     def refresh_combobox(self):
         self.case_list.clear()
         for nazwa, punkty in self.cases:
@@ -352,18 +357,17 @@ class SuperOkienkoAsi:
         xmin, ymin = region.ranges[0][0], region.ranges[1][0]
         xmax, ymax = region.ranges[0][1], region.ranges[1][1]
 
+        xs, ys = [], []
         x, y = xmin, ymin
-        all_points = []
         while x <= xmax:
-            y = ymin
-            points = []
-            while y <= ymax:
-                points.append(func([x, y]))
-                y += step
+            xs.append(x)
             x += step
-            all_points.append(points)
+        while y <= ymax:
+            ys.append(y)
+            y += step
 
-        np_array = np.array(all_points)
+        grid = np.array(np.meshgrid(xs, ys, indexing="ij")).reshape(2, -1).T
+        np_array = func.evaluate_batch(grid).reshape(len(xs), len(ys))
         print(np_array)
         img = pg.ImageItem()
 
@@ -0,0 +1,224 @@
+import asyncio
+from inspect import iscoroutinefunction
+from threading import Thread
+from typing import List
+
+import numpy as np
+
+from optimization.optimization_method import OptimizationMethod
+from optimization.trajectory import TrajectorySink
+
+
+class AsyncEvaluator:
+    """
+    Evaluates async fitness functions with up to in_flight evaluations awaited at once.
+    Evaluations run on an event loop, either its own one in a background thread or the loop of a caller
+    awaiting AsyncOptimizationMethod.start_async. Blocking callers wait for the results from another thread.
+    """
+    reports_results = True  # FitnessHandler.evaluate receives every value as it completes
+
+    def __init__(self, in_flight: int = 8, timeout: float = None, retries: int = 0, failure_value: float = None):
+        """
+        :param in_flight: Highest number of evaluations in flight
+        :param timeout: Seconds one attempt may take, None for no limit
+        :param retries: Number of further attempts after a failed or timed out one
+        :param failure_value: Value of agents whose every attempt failed, None raises the last error
+        """
+        self.in_flight = max(1, in_flight)
+        self.timeout = timeout
+        self.retries = retries
+        self.failure_value = failure_value
+        self.loop = None  # type: asyncio.AbstractEventLoop
+        self.thread = None  # type: Thread
+
+        self.evaluations = 0
+        self.retried = 0
+        self.timeouts = 0
+        self.failures = 0
+
+    def start(self):
+        """ Starts own event loop in a background thread unless some loop is attached """
+        if self.loop is None:
+            self.loop = asyncio.new_event_loop()
+            self.thread = Thread(target=self.loop.run_forever, name="async-evaluator", daemon=True)
+            self.thread.start()
+
+    def attach(self, loop: asyncio.AbstractEventLoop):
+        """ Runs evaluations on loop from now on, own loop is closed """
+        self.close()
+        self.loop = loop
+
+    async def evaluate_one(self, objective, agent) -> float:
+        """ Evaluates agent, timed out and failed attempts are retried """
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self.retried += 1
+            self.evaluations += 1
+            try:
+                if self.timeout is None:
+                    return float(await objective(agent))
+                return float(await asyncio.wait_for(objective(agent), self.timeout))
+            except asyncio.TimeoutError as e:
+                self.timeouts += 1
+                error = e
+            except Exception as e:
+                error = e
+        self.failures += 1
+        if self.failure_value is None:
+            raise error
+        return self.failure_value
+
+    async def evaluate_async(self, objective, agents, on_result=None) -> np.ndarray:
+        """
+        Evaluates objective at every agent
+        :param objective: Async fitness function taking a list of coordinates
+        :param agents: Agents to evaluate
+        :param on_result: Called with index and value of every agent as its evaluation completes
+        :return: Array of values in the order of agents
+        """
+        ret = np.empty(len(agents))
+        indices = iter(range(len(agents)))
+
+        async def worker():
+            for i in indices:
+                ret[i] = await self.evaluate_one(objective, list(agents[i]))
+                if on_result is not None:
+                    on_result(i, ret[i])
+
+        workers = [asyncio.ensure_future(worker()) for _ in range(min(self.in_flight, len(agents)))]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            for task in workers:
+                task.cancel()
+        return ret
+
+    def run(self, coroutine):
+        """ Runs coroutine on the evaluation loop and waits for its result """
+        self.start()
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            raise RuntimeError("Blocking evaluation can't run on the evaluation loop, use start_async")
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def evaluate(self, objective, agents, on_result=None) -> np.ndarray:
+        """
+        Blocking evaluate_async, interface of FitnessHandler.evaluator
+        :param on_result: Called with index and value of every agent as its evaluation completes
+        """
+        if len(agents) == 0:
+            return np.empty(0)
+        return self.run(self.evaluate_async(getattr(objective, "source", objective), agents, on_result))
+
+    def close(self):
+        """ Stops own event loop, an attached loop is only forgotten """
+        if self.thread is not None:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+            self.loop.close()
+        self.loop = None
+        self.thread = None
+
+    def __getstate__(self):
+        # the event loop is started again on the first evaluation
+        state = self.__dict__.copy()
+        state["loop"] = None
+        state["thread"] = None
+        return state
+
+
+class AsyncObjective:
+    """ Blocking view of an async fitness function, methods calling the fitness function directly use it """
+
+    def __init__(self, source, evaluator: AsyncEvaluator, input_dim: int = None):
+        self.source = source
+        self.evaluator = evaluator
+        self.dim = input_dim
+
+    def __call__(self, arguments: List[float]) -> float:
+        return self.evaluator.run(self.evaluator.evaluate_one(self.source, list(arguments)))
+
+    def input_dim(self) -> int:
+        if self.dim is None:
+            return self.source.input_dim()
+        return self.dim
+
+
+def is_async_callable(func) -> bool:
+    return iscoroutinefunction(func) or iscoroutinefunction(getattr(func, "__call__", None))
+
+
+class AsyncOptimizationMethod(OptimizationMethod):
+    """
+    Optimization with async fitness functions, meant to be mixed into a method:
+
+        class AsyncSwarm(AsyncOptimizationMethod, ParticleSwarmOptimization): pass
+
+    Population evaluations of the fitness handler keep up to in_flight evaluations awaited at once.
+    The method itself runs unchanged, start() blocks while start_async() runs it in a worker thread
+    and serves the evaluations on the loop of the caller.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.async_evaluator = AsyncEvaluator()
+        super().__init__(*args, **kwargs)
+
+    def set_async_evaluation(self, in_flight: int = 8, timeout: float = None, retries: int = 0,
+                             failure_value: float = None):
+        """
+        Configures evaluation of async fitness functions
+        :param in_flight: Highest number of evaluations in flight
+        :param timeout: Seconds one attempt may take, None for no limit
+        :param retries: Number of further attempts after a failed or timed out one
+        :param failure_value: Value of agents whose every attempt failed, None raises the last error
+        :return: self
+        """
+        self.async_evaluator.in_flight = max(1, in_flight)
+        self.async_evaluator.timeout = timeout
+        self.async_evaluator.retries = retries
+        self.async_evaluator.failure_value = failure_value
+        return self
+
+    def set_fitness_function(self, fitness_function, input_dim: int = None):
+        """
+        Sets fitness function, async callables are wrapped so the method can call them directly
+        :param fitness_function: Fitness function, plain or async
+        :param input_dim: Dimension of the arguments, needed when the function has no input_dim()
+        """
+        if is_async_callable(fitness_function):
+            fitness_function = AsyncObjective(fitness_function, self.async_evaluator, input_dim)
+        return super().set_fitness_function(fitness_function)
+
+    def use_async_evaluator(self):
+        """ Routes population evaluations of the handler through the async evaluator """
+        if self.handler is not None and isinstance(self.fitness_function, AsyncObjective):
+            self.handler.evaluator = self.async_evaluator
+
+    def init_population(self, agents=None, gen_count=1):
+        self.use_async_evaluator()
+        super().init_population(agents, gen_count)
+
+    def start(self, save=None, sink: TrajectorySink = None):
+        self.use_async_evaluator()
+        return super().start(save, sink)
+
+    async def start_async(self, save=None, sink: TrajectorySink = None):
+        """
+        Runs start() in a worker thread, evaluations are awaited on the running loop
+        :param save: save agent state after save iterations
+        :param sink: Trajectory sink receiving the saved states, see OptimizationMethod.start
+        :return: List of saved agents
+        """
+        self.async_evaluator.attach(asyncio.get_running_loop())
+        try:
+            return await asyncio.to_thread(self.start, save, sink)
+        finally:
+            self.async_evaluator.loop = None
+
+    def close(self):
+        super().close()
+        self.async_evaluator.close()
+        return self
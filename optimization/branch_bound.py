@@ -0,0 +1,115 @@
+from heapq import heappop, heappush
+from math import inf
+
+from optimization.optimization_method import OptimizationMethod
+from pmath.util.hcuberegion import HCubeRegion
+
+
+class BranchAndBound(OptimizationMethod):
+    """
+    Deterministic global minimization by interval branch and bound.
+    Boxes are halved across their widest edge and bounded with interval arithmetic,
+    boxes whose lower bound exceeds the best value found so far can't hold the minimum and are discarded.
+    The method finishes once the best value is certified to be within precision from the global minimum.
+    """
+
+    def __init__(self, precision: float = 10e-5, min_width: float = 10e-9, boxes_per_iteration: int = 1,
+                 region: HCubeRegion = None):
+        """
+        :param precision: Requested gap between the best value found and the certified lower bound
+        :param min_width: Boxes narrower than this in every dimension aren't split any further
+        :param boxes_per_iteration: Number of boxes split in one iteration
+        :param region: Region to minimize over
+        """
+        super().__init__(region)
+        self.precision = precision
+        self.min_width = min_width
+        self.boxes_per_iteration = boxes_per_iteration
+
+        self.boxes = []  # heap of (lower bound, order, box)
+        self.leaves = []  # lower bounds of boxes too small to split
+        self.discarded_bound = inf  # lowest lower bound of the discarded boxes
+        self.order = 0
+        self.best_point = None
+        self.best_value = inf
+        self.lower_bound = -inf
+
+    def init_population(self, agents=None, gen_count=1):
+        if self.region is None:
+            dim = self.fitness_function.input_dim()
+            self.region = HCubeRegion([0] * dim, [1] * dim)
+        region = self.region.bounding_hcube()
+
+        for agent in agents or []:
+            self.evaluate(agent)
+        self.bound(region)
+        if self.best_point is None:
+            self.best_point = [(low + high) / 2 for low, high in region.ranges]
+
+        self.agents = [list(self.best_point)]
+        if self.handler is not None:
+            self.handler.set_population(self.agents)
+        self.update_lower_bound()
+
+    def evaluate(self, point):
+        """ Evaluates point and keeps it if it is the best one so far """
+        try:
+            value = self.value(point)
+        except (ArithmeticError, ValueError):
+            return
+        if value < self.best_value:
+            self.best_value = value
+            self.best_point = list(point)
+
+    def bound(self, box: HCubeRegion):
+        """ Bounds the function over box, the box is queued unless it can be discarded """
+        lower = self.fitness_function.evaluate_interval(box).low
+        if lower <= self.best_value - self.precision:
+            self.evaluate([(low + high) / 2 for low, high in box.ranges])
+        if lower > self.best_value - self.precision:
+            self.discarded_bound = min(self.discarded_bound, lower)
+            return
+        if all(high - low < self.min_width for low, high in box.ranges):
+            self.leaves.append(lower)
+            return
+        heappush(self.boxes, (lower, self.order, box))
+        self.order += 1
+
+    def split(self, box: HCubeRegion):
+        """ Splits box into parts covering it, halving the widest edge shrinks every edge eventually """
+        return box.widest_split()
+
+    def update_lower_bound(self):
+        """ Recomputes the certified lower bound of the minimum and finishes the method once it is tight enough """
+        lower = min(self.leaves, default=self.discarded_bound)
+        lower = min(lower, self.discarded_bound)
+        if self.boxes:
+            lower = min(lower, self.boxes[0][0])
+        self.lower_bound = min(lower, self.best_value)
+        if self.best_value - self.lower_bound <= self.precision:
+            self.finished = True
+
+    def do_iteration(self):
+        if not self.started:
+            raise RuntimeError("This method must be started with self.start()")
+
+        for i in range(self.boxes_per_iteration):
+            if not self.boxes:
+                break
+            lower, order, box = heappop(self.boxes)
+            if lower > self.best_value - self.precision:
+                # every other box has a higher lower bound
+                self.discarded_bound = min(self.discarded_bound, lower)
+                self.boxes.clear()
+                break
+            for part in self.split(box):
+                self.bound(part)
+
+        self.update_lower_bound()
+        self.agents[0][:] = self.best_point
+        if self.handler is not None:
+            self.handler.refresh()
+        return self.agents
+
+    def method(self, agent, i):
+        pass
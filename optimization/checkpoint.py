@@ -0,0 +1,55 @@
+import os
+import pickle
+import random
+
+import numpy as np
+
+from pmath.util import vector_util
+from pmath.util.region import Region
+
+FORMAT_VERSION = 1
+FORMAT_NAME = "pmath-checkpoint"
+
+
+def random_state() -> dict:
+    """ Returns state of the random number generators shared by all methods """
+    return {"random": random.getstate(), "numpy": np.random.get_state(), "region": Region.default_generators,
+            "directions": vector_util._normal_generators}
+
+
+def set_random_state(state: dict):
+    random.setstate(state["random"])
+    np.random.set_state(state["numpy"])
+    Region.default_generators[:] = state["region"]
+    vector_util._normal_generators[:] = state["directions"]
+
+
+def save_checkpoint(method, path: str):
+    """
+    Writes method together with the shared random number generators to path, the file is replaced atomically
+    :param method: Optimization method to save
+    :param path: Path of the checkpoint
+    """
+    temporary = "{}.{}.tmp".format(path, os.getpid())
+    with open(temporary, "wb") as file:
+        pickle.dump((FORMAT_NAME, FORMAT_VERSION, method, random_state()), file, protocol=pickle.HIGHEST_PROTOCOL)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary, path)
+
+
+def load_checkpoint(path: str):
+    """
+    Reads method saved by save_checkpoint and restores the shared random number generators
+    :raises ValueError if the file holds something else or an unsupported version
+    :return: Optimization method
+    """
+    with open(path, "rb") as file:
+        state = pickle.load(file)
+    if not isinstance(state, tuple) or len(state) < 2 or state[0] != FORMAT_NAME:
+        raise ValueError('{} does not hold a checkpoint'.format(path))
+    if state[1] != FORMAT_VERSION:
+        raise ValueError('Unsupported checkpoint version: {}'.format(state[1]))
+    _, _, method, generators = state
+    set_random_state(generators)
+    return method
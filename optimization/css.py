@@ -1,9 +1,27 @@
+import numpy as np
+
 from optimization.optimization_method import OptimizationMethod, NormalizedFitnessHandler
 from pmath.rndgen.pygen import StdRealUniformGenerator
-from pmath.util.vector_util import *
 
 
 class ChargedSystemSearch(OptimizationMethod):
+    """
+    Charged System Search. Agents are charged particles attracting each other with forces growing with the
+    fitness of the attracting particle, all pairwise forces of an iteration are computed as array operations.
+    Agents are kept in an array population, their velocities live in its velocity array.
+    """
+    array_population = True
+    epsilon = 10e-6
+
+    def __init__(self, a=1.0, dt=1.0, region=None):
+        super().__init__(region=region)
+        self.velocities = np.empty((0, 0))  # velocities of agents kept outside of the array population
+        self.a = a
+        self.dt = dt
+        self.handler = NormalizedFitnessHandler()
+        self.generator = StdRealUniformGenerator()
+        self.rng = np.random.default_rng(int(self.generator.get() * 2 ** 63))
+
     def normalized_time(self):
         if self.iteration_limit > 0:
             return self.iteration / self.iteration_limit
@@ -11,53 +29,82 @@ class ChargedSystemSearch(OptimizationMethod):
             return self.runtime / self.time_limit
         return 0
 
-    def method(self, agent, i):
-        while i >= len(self.velocities):
-            self.velocities.append([0] * self.fitness_function.input_dim())
-
-        epsilon = 10e-6
-        best_agent, = self.handler.top_k_agents(1)
-        a = [0] * self.fitness_function.input_dim()
-        for j, other_agent in enumerate(self.agents):
-            if j != i:
-                center = vec_add(agent, other_agent)
-                rij = dist(agent, other_agent) / (dist(center, best_agent) + epsilon)
-                pij = 0
-                # extended probability
-                if self.handler.get_fitness(agent) > self.handler.get_fitness(other_agent) or \
-                                        (self.handler.get_fitness(other_agent) - self.handler.get_fitness(best_agent)) / \
-                                        (self.handler.get_fitness(other_agent) - self.handler.get_fitness(agent)) < \
-                                self.generator.get():
-
-                #simple probability
-                #if self.handler.get_fitness(agent) > self.handler.get_fitness(other_agent):
-                    pij = 1
-                if rij < self.a:
-                    c = pij * self.handler.get_fitness(other_agent) * rij / (self.a ** 3)
-                else:
-                    c = pij * self.handler.get_fitness(other_agent) / (rij ** 2)
-                diff = vec_sub(other_agent, agent)
-                diff = scl_mul(c, diff)
-                inp_vec_add(a, diff)
+    def state(self):
+        """
+        Returns positions, velocities, fitness values, row of the best agent and rows of self.agents.
+        Arrays are views of the population when the agents are its rows, otherwise positions are a copy of the agents
+        and velocities are self.velocities aligned with self.agents.
+        """
+        fitness = np.array([self.handler.get_fitness(agent) for agent in self.agents])
+        best = self.handler.top_k_agents(1)[0]
+        if self.population is not None and len(self.population) == len(self.agents):
+            try:
+                rows = self.population.indices_of(self.agents)
+            except (ValueError, AttributeError):
+                rows = None
+            if rows is not None:
+                values = np.empty(len(rows))
+                values[rows] = fitness
+                return self.population.positions, self.population.velocities, values, \
+                    self.population.index_of(best), rows
+
+        positions = np.asarray(self.agents, dtype=float)
+        if self.velocities.shape != positions.shape:
+            self.velocities = np.zeros(positions.shape)
+        rows = np.arange(len(self.agents))
+        best = next(i for i, agent in enumerate(self.agents) if agent is best)
+        return positions, self.velocities, fitness, best, rows
+
+    def accelerations(self, positions, fitness, best, targets):
+        """
+        Returns resultant forces acting on agents at rows targets
+        :param positions: (n, d) array of positions
+        :param fitness: Fitness values of the agents
+        :param best: Row of the best agent
+        :param targets: Rows of the agents to compute forces for
+        """
+        x = positions[targets]
+        squares = np.einsum("ij,ij->i", positions, positions)
+        distances = squares[targets][:, None] + squares[None, :] - 2 * x @ positions.T
+        distances = np.sqrt(np.maximum(distances, 0))
+        # distance of the sum of the pair from the best agent
+        shifted = x - positions[best]
+        centers = np.einsum("ij,ij->i", shifted, shifted)[:, None] + squares[None, :] + 2 * shifted @ positions.T
+        centers = np.sqrt(np.maximum(centers, 0))
+        rij = distances / (centers + ChargedSystemSearch.epsilon)
+
+        own, other = fitness[targets][:, None], fitness[None, :]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            # extended probability, pairs of equal fitness don't attract
+            pij = (own > other) | ((other - fitness[best]) / (other - own) < self.rng.random(rij.shape))
+            pij[np.arange(len(targets)), targets] = False
+            c = np.where(rij < self.a, rij / (self.a ** 3), 1 / (rij ** 2))
+        c = np.where(pij, other * c, 0.0)
+        return c @ positions - c.sum(axis=1)[:, None] * x
+
+    def move(self, positions, velocities, fitness, best, targets):
+        """ Moves agents at rows targets, the positions and velocities are updated in place """
+        a = self.accelerations(positions, fitness, best, targets)
         kv = 0.5 * (1 - self.normalized_time())
         ka = 0.5 * (1 + self.normalized_time())
-        randj1 = self.generator.get()
-        randj2 = self.generator.get()
-        c1 = randj1*ka*(self.dt**2)
-        c2 = randj2*kv*self.dt
-        a1 = scl_mul(c1, a)
-        a2 = scl_mul(c2, self.velocities[i])
-        agent_new = vec_add(agent, a1, a2)
-        dx = vec_sub(agent_new, agent)
-        self.velocities[i] = scl_mul(1/self.dt, dx)
+        randj1 = self.rng.random(len(targets))[:, None]
+        randj2 = self.rng.random(len(targets))[:, None]
+        dx = randj1 * ka * (self.dt ** 2) * a + randj2 * kv * self.dt * velocities[targets]
+        positions[targets] += dx
+        velocities[targets] = dx / self.dt
 
-        replace(agent, agent_new)
+    def call_methods(self):
+        if not self.agents:
+            return
+        positions, velocities, fitness, best, rows = self.state()
+        self.move(positions, velocities, fitness, best, np.arange(len(positions)))
+        if velocities is self.velocities:
+            # positions are a copy of agents held in plain lists
+            for agent, row in zip(self.agents, rows):
+                agent[:] = positions[row].tolist()
 
-
-    def __init__(self, a=1.0, dt=1.0, region=None):
-        super().__init__(region=region)
-        self.velocities = []
-        self.a = a
-        self.dt = dt
-        self.handler = NormalizedFitnessHandler()
-        self.generator = StdRealUniformGenerator()
+    def method(self, agent, i):
+        positions, velocities, fitness, best, rows = self.state()
+        target = rows[i]
+        self.move(positions, velocities, fitness, best, np.array([target]))
+        agent[:] = positions[target].tolist() if isinstance(agent, list) else positions[target]
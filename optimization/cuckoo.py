@@ -1,32 +1,78 @@
 import random
+from math import gamma, pi, sin
+
+import numpy as np
 
 from optimization.optimization_method import OptimizationMethod
-from optimization.walk import LevyFlight
 from pmath.util.region import Region
-from pmath.util.vector_util import replace
 
 
 class CuckooSearch(OptimizationMethod):
-    def __init__(self, population_size=20, pa=0.7, region: Region = None):
+    """
+    Cuckoo Search. All Levy flights of an iteration are generated as one batch with Mantegna's algorithm,
+    every candidate is evaluated exactly once and nest values are kept between iterations,
+    so only candidates and new nests are evaluated.
+    """
+
+    def __init__(self, population_size=20, pa=0.7, region: Region = None, beta=1.5, scale=1.0):
+        """
+        :param pa: Share of nests getting a flight and share of nests abandoned every iteration
+        :param beta: Exponent of the Levy distribution of flight lengths, between 0 and 2
+        :param scale: Scale of flights
+        """
         super().__init__(region=region)
         self.handler = None
-        self.walker = LevyFlight()
         self.pa = pa
-        self.population_size=population_size
+        self.population_size = population_size
+        self.beta = beta
+        self.scale = scale
+        self.nest_positions = np.empty((0, 0))  # positions of nests whose values are known
+        self.nest_values = np.empty(0)  # values of nest_positions, nan for nests not evaluated yet
+        self.rng = np.random.default_rng(random.getrandbits(64))
 
-    def call_methods(self):
-        flights = min(len(self.agents), self.pa*len(self.agents))
+    def levy_steps(self, count: int, dim: int) -> np.ndarray:
+        """ Returns (count, dim) array of Levy distributed steps (Mantegna's algorithm) """
+        beta = self.beta
+        sigma = (gamma(1 + beta) * sin(pi * beta / 2) /
+                 (gamma((1 + beta) / 2) * beta * 2 ** ((beta - 1) / 2))) ** (1 / beta)
+        u = self.rng.normal(0, sigma, (count, dim))
+        v = self.rng.normal(0, 1, (count, dim))
+        return self.scale * u / np.abs(v) ** (1 / beta)
 
-        for i in range(int(flights)):
-            agent = random.choice(self.agents)
-            candidate = agent.copy()
+    def nest_state(self):
+        """ Returns positions and values of self.agents, only nests moved since the last iteration are evaluated """
+        positions = np.asarray(self.agents, dtype=float).reshape(len(self.agents), -1)
+        values = np.full(len(positions), np.nan)
+        if self.nest_positions.shape == positions.shape:
+            # agents may be changed by others (eg. mixers), stored values are used for unchanged nests only
+            same = np.all(self.nest_positions == positions, axis=1)
+            values[same] = self.nest_values[same]
+        unknown = np.flatnonzero(np.isnan(values))
+        values[unknown] = self.values(positions[unknown])
+        return positions, values
+
+    def call_methods(self):
+        if not self.agents:
+            return
+        positions, values = self.nest_state()
+        count, dim = positions.shape
 
-            self.walker.method(candidate,0)
-            if self.fitness_function(candidate) < self.fitness_function(agent):
-                replace(agent, candidate)
+        flights = int(min(count, self.pa * count))
+        nests = self.rng.integers(count, size=flights)
+        candidates = positions[nests] + self.levy_steps(flights, dim)
+        candidate_values = self.values(candidates)
 
-        self.agents.sort(key=self.fitness_function)
-        self.agents = self.agents[0:int(len(self.agents)*(1-self.pa))]
-        new_agents = [self.region.get_random_point() for i in range(self.population_size-len(self.agents))]
-        self.agents += new_agents
+        # a nest chosen several times takes its best candidate
+        order = np.lexsort((candidate_values, nests))
+        best = order[np.unique(nests[order], return_index=True)[1]]
+        best = best[candidate_values[best] < values[nests[best]]]
+        for flight in best:
+            self.agents[nests[flight]][:] = candidates[flight].tolist()
+        positions[nests[best]] = candidates[best]
+        values[nests[best]] = candidate_values[best]
 
+        kept = np.argsort(values, kind="stable")[:int(count * (1 - self.pa))]
+        new_agents = [self.region.get_random_point() for i in range(self.population_size - len(kept))]
+        self.agents = [self.agents[i] for i in kept] + new_agents
+        self.nest_positions = np.concatenate([positions[kept], np.reshape(new_agents, (-1, dim))])
+        self.nest_values = np.concatenate([values[kept], np.full(len(new_agents), np.nan)])
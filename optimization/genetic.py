@@ -1,3 +1,9 @@
+from concurrent.futures import FIRST_COMPLETED, wait
+from multiprocessing import cpu_count
+from time import perf_counter
+
+import numpy as np
+
 from optimization.optimization_method import OptimizationMethod, NormalizedFitnessHandler
 from optimization.walk import RandomWalk, LevyFlight
 from pmath.rndgen.pygen import StdRealUniformGenerator
@@ -6,6 +12,8 @@ from pmath.util.vector_util import *
 
 
 class GeneticAlgorithm(OptimizationMethod):
+    agent_keyed = ("mutators",)
+
     def __init__(self, p_cross1=0.6, p_cross2=0.3, p_mutation=0.02, elitism=0.1, mu=20, lambdaf=40, region=None):
         super().__init__(region)
 
@@ -29,12 +37,22 @@ class GeneticAlgorithm(OptimizationMethod):
         self.candidates = self.mu_and_lambda
         self.mu = mu
         self.lambdaf = lambdaf
+        self.parent_distribution = None  # set while breeding a generation from the same agents
+
+    def parent_weight(self, agent):
+        return 1.1 - self.handler.get_fitness(agent)
+
+    def parent_pool(self):
+        """ Returns weighted distribution of parents, the one of the current generation while it's bred """
+        if self.parent_distribution is not None:
+            return self.parent_distribution
+        return self.selector.distribution(self.agents, self.parent_weight)
 
     def unique_parents(self):
-        return self.selector.population(self.agents, 2, lambda x: 1.1 - self.handler.get_fitness(x))
+        return self.parent_pool().sample(2, replace=False)
 
     def nonunique_parents(self):
-        return [self.selector.choose(self.agents, lambda x: 1.1 - self.handler.get_fitness(x)) for i in range(2)]
+        return self.parent_pool().sample(2)
 
     def mu_plus_lambda(self, new_pop):
         return self.agents.copy() + new_pop
@@ -99,6 +117,7 @@ class GeneticAlgorithm(OptimizationMethod):
         p = self.p_cross1 / l
 
         new_population = []
+        self.parent_distribution = self.selector.distribution(self.agents, self.parent_weight)
         for i in range(self.lambdaf):
             parents = self.parents()
 
@@ -107,13 +126,15 @@ class GeneticAlgorithm(OptimizationMethod):
                 new_population.append(self.cross1(parents[0], parents[1]))
             else:
                 new_population.append(self.cross2(parents[0], parents[1]))
+        self.parent_distribution = None
 
-        self.handler.set_population(new_population)
+        # parents joining the candidates may have been walked in place, so the whole pool is scored
         new_population = self.candidates(new_population)
+        self.handler.set_population(new_population)
         new_population = self.selector.population(new_population,
                                                   self.mu - int(len(self.agents) * self.elitism),
-                                                  lambda xx: 1.1 - self.handler.get_fitness(xx))
-        self.agents.sort(key=self.fitness_function)
+                                                  self.parent_weight)
+        self.agents.sort(key=self.value)
         for i in range(int(len(self.agents) * self.elitism)):
             new_population.append(self.agents[i])
         self.agents = new_population
@@ -131,3 +152,114 @@ class ESMuPlusLambda(GeneticAlgorithm):
                          region=region)
         self.parents = self.nonunique_parents
         self.candidates = self.mu_plus_lambda
+
+
+class SteadyStateGeneticAlgorithm(GeneticAlgorithm):
+    """
+    Asynchronous steady state variant. A new child is bred whenever a worker frees up and joins the population
+    as soon as its value arrives, then one agent outside the elite is dropped, chosen with weights growing
+    with its normalized fitness. One iteration inserts lambdaf children.
+    """
+    refresh_after_iteration = False  # values of the children are kept as they arrive
+
+    def __init__(self, p_cross1=0.6, p_cross2=0.3, p_mutation=0.02, elitism=0.1, mu=20, lambdaf=40, region=None,
+                 workers=None, kind="process"):
+        """
+        :param workers: Number of evaluation workers, number of cpus by default
+        :param kind: "process", or "thread" for fitness functions releasing the GIL
+        """
+        super().__init__(p_cross1=p_cross1, p_cross2=p_cross2, p_mutation=p_mutation, elitism=elitism, mu=mu,
+                         lambdaf=lambdaf, region=region)
+        self.workers = workers or cpu_count()
+        self.kind = kind
+        self.in_flight = {}  # future -> (child, submit time)
+        self.busy_time = 0.0
+        self.wall_time = 0.0
+        self.children = 0
+
+    def breed(self):
+        """ Returns a new child of two parents from the current population, the parents stay untouched """
+        originals = self.parents()
+        # cross2 walks its parents in place, so it gets copies sharing fitness and mutation scale of the originals
+        parents = [parent.copy() for parent in originals]
+        for copy, parent in zip(parents, originals):
+            self.mutators[id(copy)] = self.mutators[id(parent)]
+            self.handler.cache[id(copy)] = self.handler.cache[id(parent)]
+        l = self.p_cross1 + self.p_cross2
+        if self.mutation_generator.get() < self.p_cross1 / l:
+            child = self.cross1(parents[0], parents[1])
+        else:
+            child = self.cross2(parents[0], parents[1])
+        for copy in parents:
+            del self.mutators[id(copy)]
+            del self.handler.cache[id(copy)]
+        if self.mutation_generator.get() < self.p_mutation:
+            self.mutation(child)
+        return child
+
+    def clean_up_mutators(self):
+        # children still being evaluated keep their mutation scale
+        flying = {id(child): self.mutators[id(child)] for child, submitted in self.in_flight.values()}
+        super().clean_up_mutators()
+        self.mutators.update(flying)
+
+    def insert(self, child, value: float):
+        """ Adds evaluated child to the population and drops one agent outside the elite """
+        self.agents.append(child)
+        self.handler.update(np.append(self.handler.values, value))
+        if len(self.agents) <= self.mu:
+            return
+        elite = int(self.mu * self.elitism)
+        victim = self.selector.choose(self.agents[elite:], lambda x: self.handler.get_fitness(x) + 0.1)
+        index = next(i for i in range(elite, len(self.agents)) if self.agents[i] is victim)
+        del self.agents[index]
+        self.mutators.pop(id(victim), None)
+        self.handler.update(np.delete(self.handler.values, index))
+
+    def fill(self):
+        """ Keeps every worker busy with a child """
+        while len(self.in_flight) < self.workers:
+            child = self.breed()
+            future = self.pool.submit(self.fitness_function, [child])
+            self.in_flight[future] = (child, perf_counter())
+
+    def call_methods(self):
+        if self.pool is None:
+            self.set_async(True, self.workers, self.kind)
+        self.clean_up_mutators()
+        start = perf_counter()
+        inserted = 0
+        while inserted < self.lambdaf:
+            self.fill()
+            done, _ = wait(self.in_flight, return_when=FIRST_COMPLETED)
+            now = perf_counter()
+            for future in done:
+                child, submitted = self.in_flight.pop(future)
+                self.busy_time += now - submitted
+                self.handler.evaluations += 1
+                self.insert(child, float(future.result()[0]))
+                inserted += 1
+        self.children += inserted
+        self.wall_time += perf_counter() - start
+
+    def __getstate__(self):
+        # children in flight are bred again after a restore
+        state = super().__getstate__()
+        state["in_flight"] = {}
+        return state
+
+    def utilization(self) -> float:
+        """ Returns fraction of the worker time spent evaluating children so far """
+        if self.wall_time == 0:
+            return 0.0
+        return min(1.0, self.busy_time / (self.workers * self.wall_time))
+
+    def statistics(self) -> dict:
+        return {"workers": self.workers, "children": self.children, "in_flight": len(self.in_flight),
+                "busy_time": self.busy_time, "wall_time": self.wall_time, "utilization": self.utilization()}
+
+    def close(self):
+        for future in self.in_flight:
+            future.cancel()
+        self.in_flight.clear()
+        return super().close()
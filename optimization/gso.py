@@ -1,11 +1,22 @@
+import random
+
+import numpy as np
+
 from optimization.optimization_method import OptimizationMethod, NormalizedFitnessHandler
-from optimization.walk import RandomWalk, NormalDistribution01
-from pmath.rndgen.util import WeightedSelector
+from optimization.population import Population
+from pmath.util.neighbors import UniformGrid
 from pmath.util.region import Region
-from pmath.util.vector_util import dist, vec_sub, inp_scl_mul, inp_vec_add
 
 
 class GlowwormSwarmOptimization(OptimizationMethod):
+    """
+    Glowworm Swarm Optimization. Agents are kept in an array population, luciferin levels and radii
+    of the worms are its per agent arrays. Neighborhoods are found with a uniform grid of cells of size r0
+    rebuilt every iteration.
+    """
+    array_population = True
+    epsilon = 10e-6
+
     def __init__(self, stepsize=0.2, r0=1, rho=0.4, gamma=0.6, beta=0.08, nt=5, l0=5, region: Region = None):
         super().__init__(region=region)
         self.handler = NormalizedFitnessHandler()
@@ -15,48 +26,89 @@ class GlowwormSwarmOptimization(OptimizationMethod):
         self.beta = beta
         self.nt = nt
         self.l0 = l0
-        self.luciferin_levels = {}
-        self.radii = {}
-        self.inited = False
-        self.selector = WeightedSelector()
         self.stepsize = stepsize
-        self.gauss_walker = RandomWalk(walk_generator=NormalDistribution01())
-    def call_methods(self):
-        if not self.inited:
-            for glowworm in self.agents:
-                self.luciferin_levels[id(glowworm)] = self.l0
-                self.radii[id(glowworm)] = self.r0
-                self.inited = True
+        self.mirror = None  # type: Population  # state of worms held in plain lists (eg. by mixers)
+        self.rng = np.random.default_rng(random.getrandbits(64))
+
+    def colony(self):
+        """
+        Returns population holding the worms and rows of self.agents in it.
+        Agents which aren't rows of the array population are copied to a population of the method,
+        its luciferin levels and radii are kept as long as the number of agents doesn't change.
+        """
+        population, rows = self.population, None
+        if population is not None:
+            try:
+                rows = population.indices_of(self.agents)
+            except (ValueError, AttributeError):
+                pass
+        if rows is None:
+            if self.mirror is None or len(self.mirror) != len(self.agents):
+                self.mirror = Population.from_agents(self.agents)
+            else:
+                self.mirror.positions[:] = self.agents
+            population, rows = self.mirror, np.arange(len(self.agents))
+        if "luciferin" not in population.arrays:
+            population.add_array("luciferin", fill=self.l0)
+            population.add_array("radii", fill=self.r0)
+        return population, rows
 
-        for i, glowworm in enumerate(self.agents):
-            self.luciferin_levels[id(glowworm)] *= (1 - self.rho)
-            self.luciferin_levels[id(glowworm)] += self.gamma * self.handler.get_fitness(glowworm)
+    @property
+    def luciferin_levels(self) -> np.ndarray:
+        """ Luciferin levels in the order of population rows """
+        return self.colony()[0].array("luciferin")
 
-        for i, glowworm in enumerate(self.agents):
-            func = lambda x: dist(x, glowworm) <= self.radii[id(glowworm)] and \
-                                           self.handler.get_fitness(glowworm) >= self.handler.get_fitness(x)
-            neigbrohood = filter(func, self.agents)
-            luciferin_sum = sum([self.luciferin_levels[id(worm)] for worm in neigbrohood])
-            neigbrohood = [item for item in self.agents if func(item)]
-            #print(func(glowworm))
-            candidates = []
-            for neigbro in neigbrohood:
+    @property
+    def radii(self) -> np.ndarray:
+        """ Neighborhood radii in the order of population rows """
+        return self.colony()[0].array("radii")
 
-                pij = max(10e-6, self.luciferin_levels[id(neigbro)]-self.luciferin_levels[id(glowworm)])
-                pij /= luciferin_sum - self.luciferin_levels[id(glowworm)] + 10e-6
-                candidates.append((pij, neigbro))
-            if len(neigbrohood) == 1:
-                self.gauss_walker.scale = self.radii[id(glowworm)]*0.04
-                self.gauss_walker.method(glowworm, 0)
-            chance, punny_worm = self.selector.choose(candidates, key=lambda x: x[0])
-            cdx = self.stepsize/(dist(punny_worm, glowworm) + 10e-6)
-            dx = vec_sub(punny_worm, glowworm)
-            inp_scl_mul(cdx, dx)
-            inp_vec_add(glowworm, dx)
-            self.radii[id(glowworm)] = min(self.r0, max(0, self.radii[id(glowworm)]+self.beta*(self.nt - len(neigbrohood))))
+    def choose(self, groups, weights, count):
+        """
+        Chooses one pair of every group with probability proportional to its weight
+        :param groups: Group of every pair, sorted, every group of range(count) has a pair
+        :param weights: Non negative weights of pairs
+        :return: Indices of chosen pairs
+        """
+        cumulative = np.cumsum(weights)
+        ends = np.cumsum(np.bincount(groups, minlength=count)) - 1
+        totals = np.bincount(groups, weights=weights, minlength=count)
+        targets = cumulative[ends] - totals * self.rng.random(count)
+        return np.minimum(np.searchsorted(cumulative, targets), ends)
 
+    def call_methods(self):
+        if not self.agents:
+            return
+        population, rows = self.colony()
+        count = len(population)
+        positions, luciferin, radii = population.positions, population.array("luciferin"), population.array("radii")
+        fitness = np.empty(count)
+        fitness[rows] = self.handler.get_fitness_values(self.agents)
 
+        luciferin *= (1 - self.rho)
+        luciferin += self.gamma * fitness
 
+        # every worm is its own neighbor, so no neighborhood is empty
+        i, j, distances = UniformGrid(positions, self.r0).pairs_within(radii)
+        brighter = fitness[i] >= fitness[j]
+        i, j, distances = i[brighter], j[brighter], distances[brighter]
+        sizes = np.bincount(i, minlength=count)
+        sums = np.bincount(i, weights=luciferin[j], minlength=count)
+        weights = np.maximum(10e-6, luciferin[j] - luciferin[i]) / (sums[i] - luciferin[i] + 10e-6)
+        chosen = self.choose(i, weights, count)
 
+        dx = positions[j[chosen]] - positions
+        dx *= (self.stepsize / (distances[chosen] + GlowwormSwarmOptimization.epsilon))[:, None]
+        positions += dx
 
+        # lonely worms take a gaussian step in a random direction
+        lonely = np.flatnonzero(sizes == 1)
+        directions = self.rng.standard_normal((len(lonely), population.dim))
+        directions /= np.linalg.norm(directions, axis=1)[:, None]
+        steps = radii[lonely] * 0.04 * self.rng.standard_normal(len(lonely))
+        positions[lonely] += steps[:, None] * directions
 
+        radii[:] = np.minimum(self.r0, np.maximum(0, radii + self.beta * (self.nt - sizes)))
+        if population is self.mirror:
+            for agent, row in zip(self.agents, rows):
+                agent[:] = positions[row].tolist()
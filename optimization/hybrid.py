@@ -32,6 +32,9 @@ class PerAgentMixer(OptimizationMethod):
 
         self.methods.append((weight, method))
 
+    def sub_methods(self):
+        return [method for weight, method in self.methods]
+
     def get_weight(self, method_tup):
         weight = method_tup[0]
         if issubclass(type(weight), MathFunction):
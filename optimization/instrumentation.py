@@ -0,0 +1,111 @@
+import csv
+import json
+from contextlib import nullcontext
+from time import perf_counter
+
+_untimed = nullcontext()
+
+
+class Phase:
+    """ Context manager adding time spent inside it to a phase of an Instrumentation """
+    __slots__ = ("instrumentation", "name", "start")
+
+    def __init__(self, instrumentation: 'Instrumentation', name: str):
+        self.instrumentation = instrumentation
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        times = self.instrumentation.times
+        times[self.name] = times.get(self.name, 0.0) + perf_counter() - self.start
+
+
+class Instrumentation:
+    """
+    Times phases of iterations and publishes one record per iteration to subscribers.
+    Without subscribers phases aren't timed and no records are built.
+    """
+    phases = ("iteration", "pre_operators", "methods", "post_operators", "refresh", "evaluation", "save", "changes",
+              "checkpoint")  # phases every record reports, zero when not entered
+
+    def __init__(self):
+        self.subscribers = []
+        self.times = {}  # phase -> seconds spent in the current iteration
+        self.evaluations = 0  # evaluations counted when the previous record was published
+        self.evaluation_time = 0.0  # evaluation time counted when the previous record was published
+
+    def subscribe(self, subscriber):
+        """
+        Adds subscriber called with every record, records are dicts of numbers
+        :param subscriber: Callable, or object with a close method called by close()
+        :return: subscriber
+        """
+        self.subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        self.subscribers.remove(subscriber)
+
+    def phase(self, name: str):
+        """ Returns context manager timing a phase, it does nothing while nobody is subscribed """
+        if self.subscribers:
+            return Phase(self, name)
+        return _untimed
+
+    def publish(self, record: dict):
+        """ Adds phase times to record and sends it to subscribers, the times are reset """
+        for name in self.phases:
+            record["time_" + name] = self.times.pop(name, 0.0)
+        for name, seconds in self.times.items():
+            record["time_" + name] = seconds
+        self.times = {}
+        for subscriber in self.subscribers:
+            subscriber(record)
+
+    def __getstate__(self):
+        # subscribers may hold open files, they aren't saved with checkpoints
+        state = self.__dict__.copy()
+        state["subscribers"] = []
+        return state
+
+    def close(self):
+        """ Closes subscribers writing files """
+        for subscriber in self.subscribers:
+            if hasattr(subscriber, "close"):
+                subscriber.close()
+
+
+class JSONLSubscriber:
+    """ Writes records as lines of json """
+
+    def __init__(self, path: str):
+        self.file = open(path, "w")
+
+    def __call__(self, record: dict):
+        self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class CSVSubscriber:
+    """ Writes records as rows of a csv file, columns are the keys of the first record """
+
+    def __init__(self, path: str):
+        self.file = open(path, "w", newline="")
+        self.writer = None
+
+    def __call__(self, record: dict):
+        if self.writer is None:
+            self.writer = csv.DictWriter(self.file, fieldnames=list(record), restval="", extrasaction="ignore")
+            self.writer.writeheader()
+        self.writer.writerow(record)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
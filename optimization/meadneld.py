@@ -46,13 +46,13 @@ class MeadNelderMethod(OptimizationMethod):
         diff = vec_sub(agent, center)
         shifted_simplex = [vec_add(diff, vertex) for vertex in self.simplexes[i]]
         # print(shifted_simplex)
-        shifted_simplex.sort(key=self.fitness_function)
+        shifted_simplex.sort(key=self.value)
         # reflection
         dx = vec_sub(agent, shifted_simplex[-1])
         dx = scl_mul(self.alpha, dx)
         xr_shifted = vec_add(agent, dx)
-        if self.fitness_function(shifted_simplex[0]) <= self.fitness_function(xr_shifted) \
-                <= self.fitness_function(shifted_simplex[-2]):
+        if self.value(shifted_simplex[0]) <= self.value(xr_shifted) \
+                <= self.value(shifted_simplex[-2]):
             #print("reflecting 1")
             shifted_simplex[-1] = xr_shifted
             self.move_agent(shifted_simplex, i)
@@ -61,11 +61,11 @@ class MeadNelderMethod(OptimizationMethod):
             return
 
         # expansion
-        if self.fitness_function(xr_shifted) < self.fitness_function(shifted_simplex[0]):
+        if self.value(xr_shifted) < self.value(shifted_simplex[0]):
             dx = vec_sub(agent, xr_shifted)
             dx = scl_mul(self.gamma, dx)
             xe_shifted = vec_add(agent, dx)
-            if self.fitness_function(xe_shifted) < self.fitness_function(xr_shifted):
+            if self.value(xe_shifted) < self.value(xr_shifted):
                 #print("extending")
                 shifted_simplex[-1] = xe_shifted
                 self.simplexes[i] = unshift_simplex(shifted_simplex, diff)
@@ -79,7 +79,7 @@ class MeadNelderMethod(OptimizationMethod):
             dx = vec_sub(shifted_simplex[-1], agent)
             dx = scl_mul(self.rho, dx)
             xc_shifted = vec_add(agent, dx)
-            if self.fitness_function(xc_shifted) < self.fitness_function(shifted_simplex[-1]):
+            if self.value(xc_shifted) < self.value(shifted_simplex[-1]):
                 #print("contraction")
                 shifted_simplex[-1] = xc_shifted
                 self.simplexes[i] = unshift_simplex(shifted_simplex, diff)
@@ -1,11 +1,21 @@
 from copy import deepcopy
 from math import exp, sqrt
-from multiprocessing import Pool, cpu_count
+from multiprocessing import cpu_count
 from time import perf_counter
 from typing import List
 
+import numpy as np
+
+from optimization.checkpoint import load_checkpoint, save_checkpoint
+from optimization.instrumentation import Instrumentation
+from optimization.parallel import ParallelEvaluator
+from optimization.population import Population
+from optimization.stopping import StoppingCriterion, AnyCriterion, IterationLimit, TimeLimit, EvaluationLimit, \
+    ValueLimit, StagnationLimit
+from optimization.trajectory import TrajectorySink
 from pmath.functions.base_function import MathFunction
 from pmath.functions.elementary_functions import Polynomial
+from pmath.functions.serialization import SerializedFunction, serialize
 from pmath.rndgen.generator import Generator
 from pmath.rndgen.pygen import StdRealUniformGenerator
 from pmath.rndgen.util import NDimGenerator
@@ -20,6 +30,13 @@ class FitnessHandler:
         self.iter = 0
         self.population = None  # type: List
         self.fitness_function = None
+        self.evaluator = None  # type: ParallelEvaluator
+        self.completed = {}  # id of agent -> raw value reported by an evaluator before the whole evaluation ended
+
+        self.values = np.empty(0)  # raw fitness function values, in population order
+        self.fitness = np.empty(0)  # fitness values derived from self.values, in population order
+        self.evaluations = 0
+        self.evaluation_time = 0.0
 
         self.avg_value = 0.0
         self.best_value = 0.0
@@ -27,33 +44,112 @@ class FitnessHandler:
         self.total_change = 0.0
         self.best_agent = None
 
+    def evaluate(self, agents) -> np.ndarray:
+        """
+        Evaluates the fitness function once for every agent. Math functions are evaluated in one batch,
+        with a parallel evaluator set the agents are evaluated in chunks on its workers.
+        Evaluators reporting results (asynchronous ones) hand every value to complete() as it arrives,
+        values reported by a failed evaluation are dropped, as the agents may be moved before the next one.
+        :param agents: Agents to evaluate
+        :return: Array of raw values
+        """
+        start = perf_counter()
+        if getattr(self.evaluator, "reports_results", False):
+            self.evaluations += len(agents)
+            try:
+                self.evaluator.evaluate(self.fitness_function, agents,
+                                        on_result=lambda i, value: self.complete(agents[i], value))
+            except BaseException:
+                self.completed.clear()
+                raise
+            values = np.array([self.completed.pop(id(agent)) for agent in agents], dtype=float)
+            self.evaluation_time += perf_counter() - start
+            return values
+
+        self.evaluations += len(agents)
+        if self.evaluator is not None:
+            values = self.evaluator.evaluate(self.fitness_function, agents)
+        elif isinstance(self.fitness_function, MathFunction) and len(agents) > 0:
+            values = self.fitness_function.evaluate_batch(agents)
+        else:
+            values = np.fromiter((self.fitness_function(agent) for agent in agents), dtype=float, count=len(agents))
+        self.evaluation_time += perf_counter() - start
+        return values
 
+    def complete(self, agent, value: float):
+        """ Records raw value of agent as soon as its evaluation completes """
+        self.completed[id(agent)] = float(value)
 
     def refresh(self):
-        self.population.sort(key=self.fitness_function)
-        max_change = 0.0
-        total_change = 0.0
-        avg_fitness = 0.0
-        min_fitness = self.fitness_function(self.population[0])
-
-        for agent in self.population:
-            fitness = self.fitness_method(agent)
-            try:
-                prev_fitness = self.cache[id(agent)]
-                prev_fitness -= fitness
-                if max_change < abs(prev_fitness):
-                    max_change = abs(prev_fitness)
-                total_change += abs(prev_fitness)
-            except KeyError:
-                pass
-            self.cache[id(agent)] = fitness
-            avg_fitness += fitness
-
-        self.avg_value = avg_fitness / len(self.population)
-        self.highest_change = max_change
-        self.total_change = total_change
+        """
+        Evaluates every agent once, sorts the population by the raw values (lowest first)
+        and derives fitness values together with change statistics from them
+        """
+        self.update(self.evaluate(self.population))
+
+    def update(self, values: np.ndarray):
+        """
+        Same as refresh with already known raw values
+        :param values: Raw values in population order
+        """
+        values = np.asarray(values, dtype=float)
+        order = np.argsort(values, kind="stable")
+        self.population[:] = [self.population[i] for i in order]
+        self.values = values[order]
+        self.fitness = self.transform(self.values)
+
+        previous = np.fromiter((self.cache.get(id(agent), np.nan) for agent in self.population),
+                               dtype=float, count=len(self.population))
+        changes = np.abs(previous - self.fitness)
+        changes = changes[~np.isnan(changes)]
+        self.highest_change = float(changes.max()) if len(changes) else 0.0
+        self.total_change = float(changes.sum())
+
+        # only the current population is remembered, so ids of dead agents can't be reused with stale values
+        self.cache = {id(agent): fitness for agent, fitness in zip(self.population, self.fitness.tolist())}
+        self.penalty_cache = {id(agent): self.penalty_cache[id(agent)]
+                              for agent in self.population if id(agent) in self.penalty_cache}
+
+        self.avg_value = float(self.fitness.mean()) if len(self.fitness) else 0.0
+        if len(self.population):
+            self.best_agent = self.population[0]
+            self.best_value = float(self.values[0])
         self.iter += 1
 
+    def merge(self, agents, previous):
+        """
+        Changes the population to agents, only agents not continuing an agent of the current population are evaluated.
+        Values, fitness and penalties of continued agents move to their successors
+        :param agents: New population, it replaces the contents of the current population list
+        :param previous: For every agent the agent of the current population it continues, None for new agents
+        """
+        values = {id(agent): value for agent, value in zip(self.population, self.values.tolist())}
+        merged = np.array([values.get(id(old), np.nan) if old is not None else np.nan for old in previous])
+        fresh = np.flatnonzero([old is None or id(old) not in values for old in previous])
+        merged[fresh] = self.evaluate([agents[i] for i in fresh])
+
+        self.cache = {id(agent): self.cache[id(old)] for agent, old in zip(agents, previous)
+                      if old is not None and id(old) in self.cache}
+        self.penalty_cache = {id(agent): self.penalty_cache[id(old)] for agent, old in zip(agents, previous)
+                              if old is not None and id(old) in self.penalty_cache}
+        self.population[:] = agents
+        self.update(merged)
+
+    def transform(self, values: np.ndarray) -> np.ndarray:
+        """
+        Derives fitness values from raw fitness function values
+        :param values: Raw values sorted from the lowest
+        :return: Array of fitness values
+        """
+        raise NotImplementedError('This is an abstract base method')
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # restored by the optimization method, math functions are saved in their serialized form there
+        state["fitness_function"] = None
+        state["completed"] = {}
+        return state
+
     def set_population(self, population):
         """
         Change the population of agents. This also refreshes the fitness value
@@ -76,6 +172,15 @@ class FitnessHandler:
 
         raise KeyError("Old value cached. Did you forget to refresh?")
 
+    def get_fitness_values(self, agents) -> np.ndarray:
+        """
+        Returns fitness values of agents, penalties included
+        :param agents: Agents of the population, the population itself skips the per agent lookups
+        """
+        if agents is self.population and not self.penalty_cache and len(self.fitness) == len(agents):
+            return np.array(self.fitness, dtype=float)
+        return np.fromiter((self.get_fitness(agent) for agent in agents), dtype=float, count=len(agents))
+
     def set_fitness_function(self, fitness_function):
         self.fitness_function = fitness_function
 
@@ -122,16 +227,13 @@ class FitnessHandler:
     def penalize(self, agent, penalty):
         self.penalty_cache[id(agent)] = penalty
 
-    def fitness_method(self, agent):
-        raise NotImplementedError('This is an abstract base method')
-
 
 class DefaultFitnessHandler(FitnessHandler):
     def __init__(self):
         super().__init__()
 
-    def fitness_method(self, agent):
-        return self.fitness_function(agent)
+    def transform(self, values):
+        return values
 
 
 class NormalizedFitnessHandler(FitnessHandler):
@@ -140,18 +242,23 @@ class NormalizedFitnessHandler(FitnessHandler):
     def __init__(self):
         super().__init__()
 
-    def fitness_method(self, agent):
-        max = self.fitness_function(self.population[-1])
-        min = self.fitness_function(self.population[0])
-        fit = self.fitness_function(agent)
-        return (fit - min) / (max - min + NormalizedFitnessHandler.epsilon)
+    def transform(self, values):
+        if len(values) == 0:
+            return values
+        min, max = values[0], values[-1]
+        return (values - min) / (max - min + NormalizedFitnessHandler.epsilon)
 
 
 class OptimizationMethod:
+    array_population = False  # methods opting in keep agents as rows of a Population
+    agent_keyed = ()  # names of attributes holding dicts keyed by id() of agents
+    refresh_after_iteration = True  # the handler evaluates the population after every iteration
+
     def __init__(self, region: Region = None, generator: Generator = None):
         self.region = region  # todo generalize this to abstract sets (eg graph sets)
         self.iteration_limit = -1
         self.time_limit = float('+inf')
+        self.evaluation_limit = -1
         self.low_value_limit = float('-inf')
         self.high_value_limit = float('+inf')
         self.limit_set = False
@@ -162,6 +269,7 @@ class OptimizationMethod:
         self.fitness_function = None  # type: MathFunction
         self.processing_start = None
         self.agents = None  # type: List
+        self.population = None  # type: Population
 
         self.highest_change_limit_vw = float('-inf')
         self.highest_total_change_limit_vw = float('-inf')
@@ -169,19 +277,25 @@ class OptimizationMethod:
 
         self.started = False
         self.finished = False
-        self.allow_async_execution = False  # True
-        self.pool = None  # Pool(cpu_count())
+        self.allow_async_execution = False
+        self.pool = None  # type: ParallelEvaluator
 
         self.iteration = 0
         self.handler = DefaultFitnessHandler()  # type: FitnessHandler
 
-        self.stagnant_single_turns = 0
-        self.stagnant_sum_turns = 0
+        self.stopping = AnyCriterion()  # type: StoppingCriterion
+        self.evaluations = 0  # evaluations made by the method itself, the handler counts its own
+        self.best_value_seen = float('inf')
+        self.convergence = []  # (evaluations, best value so far) after every iteration
+
         self.dead_agents = []
         self.new_agents = []
         self.agents_to_replace = []
 
         self.runtime = 0.0
+        self.checkpoint_path = None
+        self.checkpoint_interval = 1
+        self.instrumentation = Instrumentation()
 
     def set_time_limit(self, seconds: float):
         """
@@ -191,6 +305,7 @@ class OptimizationMethod:
         """
         self.time_limit = seconds
         self.limit_set = True
+        self.stopping.add(TimeLimit(seconds))
         return self
 
     def set_iteration_limit(self, iterations: int):
@@ -201,6 +316,19 @@ class OptimizationMethod:
         """
         self.iteration_limit = iterations
         self.limit_set = True
+        self.stopping.add(IterationLimit(iterations))
+        return self
+
+    def set_evaluation_limit(self, evaluations: int):
+        """
+        Limits the execution of a method by the number of fitness function evaluations,
+        the method stops after the iteration reaching the limit
+        :param evaluations: Number of evaluations to stop after
+        :return: self
+        """
+        self.evaluation_limit = evaluations
+        self.limit_set = True
+        self.stopping.add(EvaluationLimit(evaluations))
         return self
 
     def set_value_limit(self, low_limit: float, high_limit: float):
@@ -215,6 +343,7 @@ class OptimizationMethod:
         self.low_value_limit = low_limit
         self.high_value_limit = high_limit
         self.limit_set = True
+        self.stopping.add(ValueLimit(low_limit, high_limit))
         return self
 
     def set_stagnant_limit_vw(self, highest_change: float, highest_total_change: float, stagnant_iterations: int):
@@ -230,6 +359,25 @@ class OptimizationMethod:
         self.highest_change_limit_vw = highest_change
         self.highest_total_change_limit_vw = highest_total_change
         self.consecutive_stagnant_iters_limit_vw = stagnant_iterations
+        self.stopping.add(StagnationLimit(highest_change, highest_total_change, stagnant_iterations))
+        return self
+
+    def add_stopping_criterion(self, criterion: StoppingCriterion):
+        """
+        Adds criterion to the ones stopping the method, a criterion of the same type is replaced
+        :param criterion: Stopping criterion, e.g. EvaluationLimit(1000) | TimeLimit(10)
+        :return: self
+        """
+        self.stopping.add(criterion)
+        return self
+
+    def set_stopping_criterion(self, criterion: StoppingCriterion):
+        """
+        Replaces all stopping criteria with criterion, the method still stops once finished
+        :param criterion: Stopping criterion
+        :return: self
+        """
+        self.stopping = criterion
         return self
 
     def set_fitness_function(self, fitness_function):
@@ -250,144 +398,397 @@ class OptimizationMethod:
         """
         self.handler = fitness_handler
         self.handler.set_fitness_function(self.fitness_function)
+        self.handler.evaluator = self.pool
         return self
 
     def call_methods(self):
-        if self.allow_async_execution:
-            for i, agent in enumerate(self.agents):
-                if self.allow_async_execution:
-                    self.pool.apply(self.method, agent, i)
-
-            self.pool.join()
-        else:
-            for i, agent in enumerate(self.agents):
-                self.method(agent, i)
+        # methods update agents and shared state in place, so they run here, evaluations go to the pool
+        for i, agent in enumerate(self.agents):
+            self.method(agent, i)
 
     def do_iteration(self):
         if not self.started:
             raise RuntimeError("This method must be started with self.start()")
 
-        for operator in self.pre_iteration_operators:
-            for agent in self.agents:
-                operator(agent)
+        timed = self.instrumentation.phase
+        with timed("pre_operators"):
+            for operator in self.pre_iteration_operators:
+                for agent in self.agents:
+                    operator(agent)
 
-        self.call_methods()
+        with timed("methods"):
+            self.call_methods()
 
-        for operator in self.post_iteration_operators:
-            for agent in self.agents:
-                operator(agent)
+        with timed("post_operators"):
+            for operator in self.post_iteration_operators:
+                for agent in self.agents:
+                    operator(agent)
 
-        if self.handler is not None:
-            self.handler.refresh()
+        if self.handler is not None and self.refresh_after_iteration:
+            with timed("refresh"):
+                self.handler.refresh()
         return self.agents
 
     def init_population(self, agents=None, gen_count=1):
-        if agents is not None:
+        if agents is None:
+            if self.region is None:
+                self.region = HCubeRegion([0] * self.fitness_function.input_dim(),
+                                          [1] * self.fitness_function.input_dim())
+
+            if self.generator is None:
+                generators = list(StdRealUniformGenerator() for i in range(self.fitness_function.input_dim()))
+                self.generator = NDimGenerator(generators)
+
+            agents = [self.region.get_random_point() for i in range(gen_count)]
+        elif not self.array_population:
             self.agents = agents
             return
 
-        if self.region is None:
-            self.region = HCubeRegion([0] * self.fitness_function.input_dim(), [1] * self.fitness_function.input_dim())
+        if self.array_population:
+            self.population = Population.from_agents(agents)
+            agents = self.population.rows()
 
-        if self.generator is None:
-            generators = list(StdRealUniformGenerator() for i in range(self.fitness_function.input_dim()))
-            self.generator = NDimGenerator(generators)
-
-        self.agents = [self.region.get_random_point() for i in range(gen_count)]
+        self.agents = agents
         if self.handler is not None:
             self.handler.set_population(self.agents)
 
+    def use_array_population(self):
+        """
+        Keep agents as rows of one contiguous array, list based method code keeps working on row views.
+        Has to be called before the population is initialized
+        :return: self
+        """
+        self.array_population = True
+        return self
+
     def method(self, agent, i):
         raise NotImplementedError("This has to be overloaded to do method specific operations")
 
-    def start(self, save=None):
+    def start(self, save=None, sink: TrajectorySink = None):
         """
         Starts execution of the method
         :param save: save agent state after save iterations:
+        :param sink: Trajectory sink receiving the saved states (every iteration unless save is set),
+        the returned list holds the last agents only
         :return: List of tuples of saved agents
         """
         saved = []
+        if sink is not None and save is None:
+            save = 1
         start_time = perf_counter()
         self.started = True
         if self.agents is None:
             self.init_population()
+        timed = self.instrumentation.phase
         while True:
+            iteration = self.iteration
+            with timed("iteration"):
+                agents = self.do_iteration()
+            self.runtime = perf_counter() - start_time
+            self.track_convergence()
 
-            agents = self.do_iteration()
+            if self.finished or self.stopping.should_stop(self):
+                break
 
-            if self.iteration == self.iteration_limit:
-                saved.append(agents)
-                return saved
+            if save is not None:
+                if self.iteration % save == 0:
+                    with timed("save"):
+                        self.save(saved, agents, sink)
+                    # return saved
 
-            if self.consecutive_stagnant_iters_limit_vw == self.stagnant_single_turns:
-                saved.append(agents)
-                return saved
+            self.iteration += 1
+            with timed("changes"):
+                self.apply_agent_changes()
+            if self.checkpoint_path is not None and self.iteration % self.checkpoint_interval == 0:
+                with timed("checkpoint"):
+                    self.checkpoint()
+            self.runtime = perf_counter() - start_time
+            self.publish_iteration(iteration)
 
-            if self.consecutive_stagnant_iters_limit_vw == self.stagnant_sum_turns:
-                saved.append(agents)
-                return saved
+        self.runtime = perf_counter() - start_time
+        if sink is not None:
+            with timed("save"):
+                self.record(sink, agents)
+        self.publish_iteration(iteration)
+        return saved + [agents if self.population is None else self.population.to_lists()]
 
-            if self.handler is not None:
-                if self.low_value_limit > self.handler.get_best_value():
-                    saved.append(agents)
-                    return saved
+    def value(self, agent) -> float:
+        """
+        Evaluates the fitness function at agent, methods evaluating it outside of the handler go through this
+        so every evaluation is counted
+        :param agent: Point to evaluate
+        :return: Value of the fitness function
+        """
+        self.evaluations += 1
+        value = self.fitness_function(agent)
+        if value < self.best_value_seen:
+            self.best_value_seen = value
+        return value
 
+    def values(self, agents) -> np.ndarray:
+        """
+        Evaluates the fitness function at every agent, counted like value. Math functions are evaluated
+        in one batch, with set_async the agents are evaluated on the pool
+        :param agents: Points to evaluate
+        :return: Array of values
+        """
+        self.evaluations += len(agents)
+        if len(agents) == 0:
+            return np.empty(0)
+        if self.pool is not None:
+            values = np.asarray(self.pool.evaluate(self.fitness_function, agents), dtype=float)
+        elif isinstance(self.fitness_function, MathFunction):
+            values = np.asarray(self.fitness_function.evaluate_batch(agents), dtype=float)
+        else:
+            values = np.fromiter((self.fitness_function(agent) for agent in agents), dtype=float, count=len(agents))
+        self.best_value_seen = min(self.best_value_seen, float(np.nanmin(values, initial=np.inf)))
+        return values
 
-                if self.high_value_limit < self.handler.get_best_value():
-                    saved.append(agents)
-                    return saved
+    def sub_methods(self) -> List['OptimizationMethod']:
+        """ Returns methods this one delegates to, their evaluations count as its own """
+        return []
 
-                if self.handler.highest_abschange_vw() < self.highest_change_limit_vw:
-                    self.stagnant_single_turns += 1
-                else:
-                    self.stagnant_single_turns = 0
+    def total_evaluations(self) -> int:
+        """ Returns number of fitness function evaluations made so far by the method, its handler and sub methods """
+        ret = self.evaluations
+        if self.handler is not None:
+            ret += self.handler.evaluations
+        return ret + sum(method.total_evaluations() for method in self.sub_methods())
+
+    def best_so_far(self) -> float:
+        """ Returns the best fitness function value seen so far """
+        ret = self.best_value_seen
+        if self.handler is not None and self.handler.iter > 0:
+            ret = min(ret, self.handler.values.min(initial=ret))
+        for method in self.sub_methods():
+            ret = min(ret, method.best_so_far())
+        return ret
+
+    def track_convergence(self):
+        """ Records best value seen so far against the number of evaluations """
+        self.best_value_seen = self.best_so_far()
+        self.convergence.append((self.total_evaluations(), self.best_value_seen))
+
+    def convergence_curve(self) -> np.ndarray:
+        """
+        Returns best value so far against evaluations
+        :return: Array of (evaluations, best value) rows, one per iteration
+        """
+        return np.array(self.convergence, dtype=float).reshape(-1, 2)
 
-                if self.handler.total_abschange_vw() < self.highest_total_change_limit_vw:
-                    self.stagnant_sum_turns += 1
-                else:
-                    self.stagnant_sum_turns = 0
-            if save is not None:
-                if self.iteration % save == 0:
-                    if type(agents) is list:
-                        saved.append(deepcopy(agents))
-                    else:
-                        saved.append([agent.copy() for agent in agents])
-                    # return saved
+    def subscribe(self, subscriber):
+        """
+        Subscribes to per iteration records of start(). Records hold phase times, evaluation counts,
+        best and average values and the cache hit rate of cached fitness functions
+        :param subscriber: Callable taking a record, e.g. CSVSubscriber or JSONLSubscriber
+        :return: subscriber
+        """
+        return self.instrumentation.subscribe(subscriber)
 
-            self.runtime = perf_counter() - start_time
-            if self.runtime > self.time_limit:
-                saved.append(deepcopy(agents))
-                return saved
+    def publish_iteration(self, iteration: int):
+        """ Publishes record of the finished iteration, nothing happens while nobody is subscribed """
+        instrumentation = self.instrumentation
+        if not instrumentation.subscribers:
+            return
+        record = {"iteration": iteration, "agents": len(self.agents or []), "runtime": self.runtime}
+        if self.handler is not None:
+            record.update(best_value=self.handler.best_value, avg_value=self.handler.avg_value)
+            instrumentation.times["evaluation"] = self.handler.evaluation_time - instrumentation.evaluation_time
+            instrumentation.evaluation_time = self.handler.evaluation_time
+        evaluations = self.total_evaluations()
+        record.update(evaluations=evaluations, new_evaluations=evaluations - instrumentation.evaluations,
+                      best_so_far=self.best_value_seen)
+        instrumentation.evaluations = evaluations
+        hit_rate = getattr(self.fitness_function, "hit_rate", None)
+        if hit_rate is not None:
+            record["cache_hit_rate"] = hit_rate()
+        instrumentation.publish(record)
+
+    def save(self, saved: List, agents, sink: TrajectorySink = None):
+        """ Saves copy of agents to saved, or records them in sink if it is given """
+        if sink is None:
+            saved.append(self.snapshot(agents))
+        else:
+            self.record(sink, agents)
 
-            self.iteration += 1
-            for agent in self.dead_agents:
-                if agent in self.agents:
-                    self.agents.remove(agent)
+    def record(self, sink: TrajectorySink, agents):
+        """ Records agents with their fitness values and iteration statistics in sink """
+        values = np.full(len(agents), np.nan)
+        stats = {"iteration": self.iteration, "runtime": self.runtime}
+        if self.handler is not None:
+            if len(self.handler.values) == len(agents):
+                values = self.handler.values
+            stats.update(best_value=self.handler.best_value, avg_value=self.handler.avg_value)
+        stats["evaluations"] = self.total_evaluations()
+        sink.record(self.iteration, agents, values, stats)
 
-            for agent in self.new_agents:
-                self.agents.append(agent)
+    def snapshot(self, agents):
+        """
+        Copies agents the way start() saves them, agents of an array population are saved as list of lists
+        :param agents: Agents returned by do_iteration
+        :return: Copy of agents
+        """
+        if self.population is not None:
+            return self.population.to_lists()
+        if type(agents) is list:
+            return deepcopy(agents)
+        return [agent.copy() for agent in agents]
 
+    def apply_agent_changes(self):
+        """
+        Applies deaths, births and replacements requested during the iteration.
+        Agents are matched by identity, an array population takes agents as row views or indices
+        """
+        if not (self.dead_agents or self.new_agents or self.agents_to_replace):
+            return
+        if self.population is not None:
+            # origin[i] is the index agent i had before the changes, None for new and replaced agents
+            by_index = dict(zip(self.population.indices_of(self.agents).tolist(), self.agents))
+            origin = list(range(len(self.population)))
             for old, new in self.agents_to_replace:
-                index = self.agents.index(old)
-                self.agents[index] = new
+                index = self.agent_index(old)
+                self.population.replace(index, new)
+                origin[index] = None
+            dead = [self.agent_index(agent) for agent in self.dead_agents]
+            for index in sorted(set(dead), reverse=True):
+                origin[index] = origin[-1]
+                origin.pop()
+            self.population.kill_many(dead)
+            for agent in self.new_agents:
+                self.population.add(agent)
+            agents = self.population.rows()
+            previous = [by_index.get(index) if index is not None else None for index in origin]
+            previous += [None] * len(self.new_agents)
+            # rows are new views, state keyed by ids of agents follows them
+            for name in self.agent_keyed:
+                state = getattr(self, name)
+                setattr(self, name, {id(agent): state[id(old)] for agent, old in zip(agents, previous)
+                                     if old is not None and id(old) in state})
+        else:
+            dead = {id(agent) for agent in self.dead_agents}
+            replacements = {id(old): new for old, new in self.agents_to_replace}
+            previous = [agent for agent in self.agents if id(agent) not in dead]
+            agents = [replacements.get(id(agent), agent) for agent in previous] + list(self.new_agents)
+            previous = [None if id(agent) in replacements else agent for agent in previous]
+            previous += [None] * len(self.new_agents)
+
+        if self.handler is not None and self.handler.population is self.agents:
+            # only new agents are evaluated, the handler keeps the same list, so it is updated in place
+            self.handler.merge(agents, previous)
+        else:
+            self.agents[:] = agents
 
-            self.agents_to_replace.clear()
-            self.dead_agents.clear()
-            self.new_agents.clear()
+        self.agents_to_replace.clear()
+        self.dead_agents.clear()
+        self.new_agents.clear()
 
-    def set_async(self, allow=True, cpus=cpu_count()):
+    def agent_index(self, agent) -> int:
+        """ Returns index of an agent of the array population given by a row view or an index """
+        if isinstance(agent, (int, np.integer)):
+            return int(agent)
+        return self.population.index_of(agent)
+
+    def set_async(self, allow=True, cpus=cpu_count(), kind="process", chunk_size=None, max_in_flight=None):
         """
-        Set policy for async self.method call.
-        Default its on so you don't have to call it, unless you want to change the number of cpus
+        Set policy for parallel fitness evaluation. Population evaluations of the fitness handler are
+        split into chunks evaluated on a persistent pool, the pool is shut down with close() or set_async(False)
         :param allow: True of False
-        :param cpu_cnt:
+        :param cpus: Number of workers
+        :param kind: "process", or "thread" for fitness functions releasing the GIL
+        :param chunk_size: Agents evaluated by one task
+        :param max_in_flight: Highest number of chunks submitted at once
         :return: self
         """
+        self.close()
         self.allow_async_execution = allow
         if self.allow_async_execution:
-            self.pool = Pool(cpus)
+            self.pool = ParallelEvaluator(cpus, kind, chunk_size, max_in_flight)
+        if self.handler is not None:
+            self.handler.evaluator = self.pool
+        return self
+
+    def close(self):
+        """
+        Shuts down the evaluation pool
+        :return: self
+        """
+        if self.pool is not None:
+            self.pool.close()
+        self.pool = None
+        self.allow_async_execution = False
+        if self.handler is not None:
+            self.handler.evaluator = None
+        return self
+
+    def set_checkpoint(self, path: str, interval: int = 1):
+        """
+        Checkpoint the method to path every interval iterations of start()
+        :param path: Path of the checkpoint, the file is replaced atomically
+        :param interval: Iterations between checkpoints
+        :return: self
+        """
+        self.checkpoint_path = path
+        self.checkpoint_interval = max(1, interval)
         return self
 
+    def checkpoint(self, path: str = None):
+        """
+        Saves the method and the shared random number generators, resume continues from this point
+        :param path: Path of the checkpoint, the one set by set_checkpoint by default
+        """
+        save_checkpoint(self, path or self.checkpoint_path)
+
+    @staticmethod
+    def resume(path: str) -> 'OptimizationMethod':
+        """
+        Restores method saved by checkpoint, start() on it continues the run as if it was never interrupted
+        :param path: Path of the checkpoint
+        :return: Restored method
+        """
+        return load_checkpoint(path)
+
+    def tracked_agents(self) -> List:
+        """ Returns agents whose ids key per agent state """
+        ret = list(self.agents or [])
+        if self.handler is not None and self.handler.population is not None \
+                and self.handler.population is not self.agents:
+            ret.extend(self.handler.population)
+        return ret
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["agent_ids"] = [id(agent) for agent in self.tracked_agents()]
+        if self.population is not None:
+            # rows are pickled as copies, they are taken from the population again on restore
+            state["population_rows"] = [self.population.index_of(agent) for agent in self.agents]
+        if isinstance(self.fitness_function, MathFunction):
+            state["fitness_function"] = serialize(self.fitness_function)
+        return state
+
+    def __setstate__(self, state):
+        agent_ids = state.pop("agent_ids")
+        population_rows = state.pop("population_rows", None)
+        if isinstance(state["fitness_function"], SerializedFunction):
+            state["fitness_function"] = state["fitness_function"].load()
+        self.__dict__.update(state)
+        if population_rows is not None:
+            rows = self.population.rows()
+            self.agents[:] = [rows[i] for i in population_rows]
+        if self.handler is not None:
+            self.handler.fitness_function = self.fitness_function
+
+        # agents are new objects now, state keyed by their ids follows them
+        ids = {old: id(agent) for old, agent in zip(agent_ids, self.tracked_agents())}
+
+        def remap(keyed: dict) -> dict:
+            return {ids[key]: value for key, value in keyed.items() if key in ids}
+
+        for name in self.agent_keyed:
+            setattr(self, name, remap(getattr(self, name)))
+        if self.handler is not None:
+            self.handler.cache = remap(self.handler.cache)
+            self.handler.penalty_cache = remap(self.handler.penalty_cache)
+
     def reset(self):
         """
         Resets start and finish variables.
@@ -399,18 +800,21 @@ class OptimizationMethod:
         return self
 
     def kill_agent(self, agent):
+        """ Removes agent after the iteration, agents of an array population can be given by index """
         self.dead_agents.append(agent)
 
     def add_agent(self, agent=None):
+        """ Adds agent (random one if None) after the iteration """
         if agent is None:
             if self.region is None:
                 self.region = HCubeRegion([0] * self.fitness_function.input_dim(),
                                           [1] * self.fitness_function.input_dim())
-        agent = self.region.get_random_point()
+            agent = self.region.get_random_point()
 
         self.new_agents.append(agent)
 
     def replace_agent(self, to_replace, new_agent):
+        """ Replaces agent after the iteration, agents of an array population can be given by index """
         self.agents_to_replace.append((to_replace, new_agent))
 
 class SimulatedAnnealing(OptimizationMethod):
@@ -451,7 +855,7 @@ class SimulatedAnnealing(OptimizationMethod):
         except KeyError:
             penalty = 0.0
 
-        value = self.fitness_function(candidate)
+        value = self.value(candidate)
         if exp((self.prev - value + penalty) / (self.k * temp)) > self.accepter.get():
             self.prev = value
             prev = agent
@@ -0,0 +1,137 @@
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from math import ceil
+from multiprocessing import cpu_count
+
+import numpy as np
+
+from pmath.functions.base_function import MathFunction
+from pmath.functions.serialization import SerializedFunction, serialize
+
+_objective = None  # fitness function installed in a worker process
+
+
+def _install(objective):
+    global _objective
+    if isinstance(objective, SerializedFunction):
+        objective = objective.load()
+    _objective = objective
+
+
+def _evaluate(objective, chunk) -> np.ndarray:
+    if isinstance(objective, MathFunction):
+        return np.broadcast_to(np.asarray(objective.evaluate_batch(chunk), dtype=float), (len(chunk),))
+    return np.fromiter((objective(list(agent)) for agent in chunk), dtype=float, count=len(chunk))
+
+
+def _evaluate_installed(chunk) -> np.ndarray:
+    return _evaluate(_objective, chunk)
+
+
+class ParallelEvaluator:
+    """
+    Evaluates fitness of a population in chunks on a persistent pool of workers, results come back in order.
+    Process pools get the fitness function once per worker (math functions in their compact serialized form),
+    thread pools only pay off for objectives releasing the GIL.
+    """
+
+    def __init__(self, workers: int = None, kind: str = "process", chunk_size: int = None,
+                 max_in_flight: int = None):
+        """
+        :param workers: Number of workers, number of cpus by default
+        :param kind: "process" or "thread"
+        :param chunk_size: Agents evaluated by one task, by default every worker gets about four chunks
+        :param max_in_flight: Highest number of submitted unfinished chunks, twice the workers by default
+        """
+        if kind not in ("process", "thread"):
+            raise ValueError('Unknown pool kind: {}'.format(kind))
+        self.workers = workers or cpu_count()
+        self.kind = kind
+        self.chunk_size = chunk_size
+        self.max_in_flight = max_in_flight or 2 * self.workers
+        self.executor = None
+        self.objective = None  # function the running pool evaluates
+
+    def start(self, objective):
+        """ Starts the pool for objective, a pool started for another objective is shut down first """
+        if self.executor is not None and self.objective is objective:
+            return
+        self.close()
+        if self.kind == "thread":
+            self.executor = ThreadPoolExecutor(self.workers)
+        else:
+            installed = serialize(objective) if isinstance(objective, MathFunction) else objective
+            self.executor = ProcessPoolExecutor(self.workers, initializer=_install, initargs=(installed,))
+        self.objective = objective
+
+    def submit(self, objective, agents) -> Future:
+        """
+        Submits evaluation of a few agents without waiting for it
+        :return: Future of the array of values in the order of agents
+        """
+        self.start(objective)
+        if self.kind == "thread":
+            return self.executor.submit(_evaluate, objective, agents)
+        return self.executor.submit(_evaluate_installed, np.asarray(agents, dtype=float))
+
+    def chunks(self, count: int):
+        """ Yields (start, end) bounds of chunks of count agents """
+        size = self.chunk_size or max(1, ceil(count / (4 * self.workers)))
+        for start in range(0, count, size):
+            yield start, min(start + size, count)
+
+    def evaluate(self, objective, agents) -> np.ndarray:
+        """
+        Evaluates objective at every agent
+        :param objective: Fitness function, has to be picklable for process pools unless it is a MathFunction
+        :param agents: Agents to evaluate
+        :return: Array of values in the order of agents
+        """
+        ret = np.empty(len(agents))
+        if len(agents) == 0:
+            return ret
+        self.start(objective)
+        if self.kind == "thread":
+            task, points = (lambda chunk: _evaluate(objective, chunk)), agents
+        else:
+            task, points = _evaluate_installed, np.asarray(agents, dtype=float)
+
+        pending = {}  # future -> (start, end)
+        try:
+            for start, end in self.chunks(len(agents)):
+                if len(pending) >= self.max_in_flight:
+                    self.collect(pending, ret, FIRST_COMPLETED)
+                pending[self.executor.submit(task, points[start:end])] = (start, end)
+            while pending:
+                self.collect(pending, ret, FIRST_COMPLETED)
+        finally:
+            for future in pending:
+                future.cancel()
+        return ret
+
+    @staticmethod
+    def collect(pending: dict, ret: np.ndarray, return_when):
+        """ Waits for submitted chunks and stores their values, errors of the workers are raised """
+        done, _ = wait(pending, return_when=return_when)
+        for future in done:
+            start, end = pending.pop(future)
+            ret[start:end] = future.result()
+
+    def close(self):
+        """ Shuts the workers down, queued chunks are dropped """
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+        self.executor = None
+        self.objective = None
+
+    def __getstate__(self):
+        # workers are started again on the first evaluation
+        state = self.__dict__.copy()
+        state["executor"] = None
+        state["objective"] = None
+        return state
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
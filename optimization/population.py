@@ -0,0 +1,200 @@
+from math import nan
+from typing import List
+
+import numpy as np
+
+
+class Population:
+    """
+    Agents stored as rows of one contiguous (N, d) array. Fitness, velocity and any other per agent state
+    live in parallel arrays indexed the same way.
+    Killing an agent moves the last agent into its row, so deaths, births (amortized) and replacements
+    are O(1) index operations.
+    """
+
+    def __init__(self, dim: int, capacity: int = 16):
+        """
+        :param dim: Dimension of agent positions
+        :param capacity: Number of agents that fit before the arrays are grown
+        """
+        self.dim = dim
+        self.size = 0
+        self.capacity = max(1, capacity)
+        self.arrays = {}  # name -> (capacity, *shape) array
+        self.fills = {}  # name -> value of fresh rows
+        self.views = []  # row views handed out by rows(), kept alive so their ids stay unique
+        self.view_index = {}  # id of a row view -> its index
+        self.add_array("positions", (dim,))
+        self.add_array("fitness", (), nan)
+        self.add_array("velocities", (dim,))
+
+    @staticmethod
+    def from_agents(agents, capacity: int = None) -> 'Population':
+        """
+        Builds population holding copies of given agents
+        :param agents: List of positions
+        :param capacity: Initial capacity, number of agents by default
+        """
+        agents = np.asarray(agents, dtype=float)
+        ret = Population(agents.shape[1], capacity or len(agents))
+        for agent in agents:
+            ret.add(agent)
+        return ret
+
+    def add_array(self, name: str, shape=(), fill=0., dtype=float):
+        """
+        Adds per agent state array
+        :param name: Name of the array
+        :param shape: Shape of the state of one agent
+        :param fill: Value of state of new agents
+        """
+        self.arrays[name] = np.full((self.capacity,) + tuple(shape), fill, dtype=dtype)
+        self.fills[name] = fill
+
+    def array(self, name: str) -> np.ndarray:
+        """ Returns view of the live rows of array called name """
+        return self.arrays[name][:self.size]
+
+    @property
+    def positions(self) -> np.ndarray:
+        return self.arrays["positions"][:self.size]
+
+    @property
+    def fitness(self) -> np.ndarray:
+        return self.arrays["fitness"][:self.size]
+
+    @property
+    def velocities(self) -> np.ndarray:
+        return self.arrays["velocities"][:self.size]
+
+    def grow(self, capacity: int):
+        """ Reallocates the arrays, views and rows taken earlier stop tracking the population """
+        for name, array in self.arrays.items():
+            grown = np.full((capacity,) + array.shape[1:], self.fills[name], dtype=array.dtype)
+            grown[:self.size] = array[:self.size]
+            self.arrays[name] = grown
+        self.capacity = capacity
+        self.views = []
+        self.view_index = {}
+
+    def add(self, position, **state) -> int:
+        """
+        Adds agent, its fitness is unknown (nan) until evaluated
+        :param position: Position of the new agent
+        :param state: Values of other per agent arrays
+        :return: Index of the new agent
+        """
+        if self.size == self.capacity:
+            self.grow(2 * self.capacity)
+        index = self.size
+        self.size += 1
+        for name, array in self.arrays.items():
+            array[index] = self.fills[name]
+        self.arrays["positions"][index] = position
+        for name, value in state.items():
+            self.arrays[name][index] = value
+        return index
+
+    def kill(self, index: int) -> int:
+        """
+        Removes agent, the last agent takes its index
+        :param index: Index of the agent
+        :return: Previous index of the agent moved to index, None if no agent moved
+        """
+        if not 0 <= index < self.size:
+            raise IndexError('Agent index out of range')
+        last = self.size - 1
+        if index != last:
+            for array in self.arrays.values():
+                array[index] = array[last]
+        self.size -= 1
+        return last if index != last else None
+
+    def kill_many(self, indices):
+        """ Removes agents at given indices, indices of the remaining agents may change """
+        for index in sorted(set(indices), reverse=True):
+            self.kill(index)
+
+    def replace(self, index: int, position, **state):
+        """ Moves agent to a new position, its fitness becomes unknown (nan) """
+        if not 0 <= index < self.size:
+            raise IndexError('Agent index out of range')
+        self.arrays["positions"][index] = position
+        self.arrays["fitness"][index] = nan
+        for name, value in state.items():
+            self.arrays[name][index] = value
+
+    def index_of(self, row: np.ndarray) -> int:
+        """
+        Returns index of an agent given by a row view taken from rows()
+        :raises ValueError if row is not a live row of this population
+        """
+        positions = self.arrays["positions"]
+        offset = row.__array_interface__["data"][0] - positions.__array_interface__["data"][0]
+        index, rest = divmod(offset, positions.strides[0])
+        if rest or row.shape != (self.dim,) or not np.may_share_memory(row, positions):
+            raise ValueError('Row is not a view of this population')
+        if not 0 <= index < self.size:
+            raise ValueError('Row is not a live agent of this population')
+        return index
+
+    def indices_of(self, rows) -> np.ndarray:
+        """
+        Returns indices of agents given by row views, like index_of for many rows at once
+        :raises ValueError if some row is not a live row of this population
+        """
+        lookup = self.view_index.get
+        indices = np.fromiter((lookup(id(row), -1) for row in rows), dtype=np.int64, count=len(rows))
+        unknown = np.flatnonzero(indices < 0)
+        if len(unknown):
+            positions = self.arrays["positions"]
+            pointers = np.fromiter((rows[i].__array_interface__["data"][0] for i in unknown), dtype=np.int64,
+                                   count=len(unknown))
+            indices[unknown], rest = np.divmod(pointers - positions.__array_interface__["data"][0],
+                                               positions.strides[0])
+            if np.any(rest):
+                raise ValueError('Rows are not views of this population')
+        if np.any(indices < 0) or np.any(indices >= self.size):
+            raise ValueError('Rows are not live agents of this population')
+        return indices
+
+    def rows(self) -> List[np.ndarray]:
+        """ Returns list of row views, list based code can update agents in place through them """
+        positions = self.arrays["positions"]
+        self.views = [positions[i] for i in range(self.size)]
+        self.view_index = {id(row): i for i, row in enumerate(self.views)}
+        return list(self.views)
+
+    def __getstate__(self):
+        # views would be pickled as copies
+        state = self.__dict__.copy()
+        state["views"] = []
+        state["view_index"] = {}
+        return state
+
+    def evaluate(self, func, indices=None) -> int:
+        """
+        Evaluates agents with unknown fitness (or agents at indices), math functions are evaluated in one batch
+        :return: Number of evaluations
+        """
+        if indices is None:
+            indices = np.flatnonzero(np.isnan(self.fitness))
+        if len(indices) == 0:
+            return 0
+        points = self.positions[indices]
+        if hasattr(func, "evaluate_batch"):
+            self.arrays["fitness"][indices] = func.evaluate_batch(points)
+        else:
+            self.arrays["fitness"][indices] = [func(list(point)) for point in points]
+        return len(indices)
+
+    def best(self) -> int:
+        """ Returns index of the agent with the lowest fitness """
+        return int(np.nanargmin(self.fitness))
+
+    def to_lists(self) -> List[List[float]]:
+        """ Returns copy of agent positions as list of lists """
+        return self.positions.tolist()
+
+    def __len__(self):
+        return self.size
@@ -1,76 +1,135 @@
-from typing import Tuple
+import random
+from math import ceil, sqrt
+
+import numpy as np
 
 from optimization.optimization_method import OptimizationMethod, DefaultFitnessHandler
-from pmath.rndgen.pygen import StdRealUniformGenerator
-from pmath.rndgen.util import NDimGenerator
+from optimization.population import Population
 from pmath.util.hcuberegion import HCubeRegion
-from pmath.util.vector_util import *
 
 
 class ParticleSwarmOptimization(OptimizationMethod):
-    def __init__(self, region=None, omega=0.3, phil=0.9, phig=0.1):
+    """
+    Particle Swarm Optimization updating the whole swarm at once. Particles are rows of an array population,
+    velocities and personal bests are its per agent arrays. The social term pulls particles to the best
+    personal best of their neighborhood given by the topology:
+    "gbest" - the whole swarm (the best position found so far), "ring" - particles at adjacent indices,
+    "von_neumann" - up, down, left and right neighbors on a wrapped grid of indices.
+    """
+    array_population = True
+    topologies = ("gbest", "ring", "von_neumann")
+
+    def __init__(self, region=None, omega=0.3, phil=0.9, phig=0.1, topology="gbest", velocity_region=None):
+        """
+        :param velocity_region: Region of initial velocities, velocities are clamped to its bounding hcube.
+        Without it velocities start in [-1, 1] in every dimension and aren't clamped
+        """
         super().__init__(region)
+        if topology not in ParticleSwarmOptimization.topologies:
+            raise ValueError('Unknown topology: {}'.format(topology))
         self.omega = omega
         self.phil = phil
         self.phig = phig
-        self.local_best = []
-        self.velocity_region = None  # HCubeRegion
-        self.velocities = []
-        self.init = False
+        self.topology = topology
+        self.velocity_region = velocity_region  # HCubeRegion
         self.handler = DefaultFitnessHandler()
-        self.generator = None
         self.global_best = None
         self.global_best_value = float('inf')
+        self.mirror = None  # type: Population  # state of particles held in plain lists (eg. by mixers)
+        self.rng = np.random.default_rng(random.getrandbits(64))
 
-    def init_method(self):
-        self.init = True
-        self.handler.set_population(self.agents)
-        self.global_best = self.handler.top_k_agents(1)[0]
-        generators = [StdRealUniformGenerator() for i in range(self.fitness_function.input_dim())]
-        self.generator = NDimGenerator(generators)
-
-    def method(self, agent, i):
-        if not self.init:
-            self.init_method()
-        global_best = self.handler.top_k_agents(1)[0]
-        if self.global_best_value < self.handler.get_best_value():
-            global_best = self.global_best
+    def swarm(self):
+        """
+        Returns population holding the particles and rows of self.agents in it.
+        Agents which aren't rows of the array population are copied to a population of the method,
+        its state is kept as long as the number of agents doesn't change.
+        """
+        if self.population is not None:
+            try:
+                return self.population, self.population.indices_of(self.agents)
+            except (ValueError, AttributeError):
+                pass
+        if self.mirror is None or len(self.mirror) != len(self.agents):
+            self.mirror = Population.from_agents(self.agents)
         else:
-            self.global_best = global_best
-            self.global_best_value = self.handler.get_best_value()
+            self.mirror.positions[:] = self.agents
+        return self.mirror, np.arange(len(self.agents))
 
-        # print(global_best)
-        l_best = self.get_local_best((self.handler.get_fitness(agent), agent), i)
+    def neighbors(self, count: int) -> np.ndarray:
+        """ Returns (count, k) array of indices of the neighborhood of every particle, the particle included """
+        index = np.arange(count)
+        if self.topology == "ring":
+            return (index[:, None] + np.array([-1, 0, 1])) % count
+        columns = ceil(sqrt(count))
+        row, column = np.divmod(index, columns)
+        left = row * columns + (column - 1) % columns
+        right = row * columns + (column + 1) % columns
+        return np.stack([index, left, right, index - columns, index + columns], axis=1) % count
 
-        vel = self.velocity(i)
-        inp_scl_mul(self.omega, vel)
-        gdiff = vec_sub(global_best, agent)
-        ldiff = vec_sub(l_best, agent)
-        inp_scl_mul(self.phig, gdiff)
-        inp_scl_mul(self.phil, ldiff)
-        inp_el_wise_mul(gdiff, self.generator.get())
-        inp_el_wise_mul(ldiff, self.generator.get())
-        inp_vec_add(vel, ldiff)
-        inp_vec_add(vel, gdiff)
-        self.velocities[i] = vel
-        inp_vec_add(agent, vel)
+    def velocity_bounds(self, dim: int):
+        """ Returns low and high bounds of velocities, None when they aren't clamped """
+        if self.velocity_region is None:
+            return None
+        low, high = zip(*self.velocity_region.bounding_hcube().ranges)
+        return np.array(low[:dim], dtype=float), np.array(high[:dim], dtype=float)
 
+    def move(self, population: Population, rows: np.ndarray, targets: np.ndarray):
+        """
+        Updates personal bests and moves particles at population indices targets
+        :param rows: Population indices of self.agents
+        """
+        if "best_positions" not in population.arrays:
+            # nan marks particles without personal best, their velocities are set on the first move
+            population.add_array("best_positions", (population.dim,), np.nan)
+            population.add_array("best_values", (), np.inf)
+        positions, velocities = population.positions, population.velocities
+        best_positions, best_values = population.array("best_positions"), population.array("best_values")
+        fitness = np.full(len(population), np.nan)
+        fitness[rows] = self.handler.get_fitness_values(self.agents)
+        fitness[np.isnan(fitness)] = np.inf
 
+        fresh = targets[np.isnan(best_positions[targets, 0])]
+        if len(fresh):
+            region = self.velocity_region
+            if region is None:
+                region = HCubeRegion([-1] * population.dim, [1] * population.dim)
+            velocities[fresh] = [region.get_random_point() for i in fresh]
+            best_positions[fresh] = positions[fresh]
+            best_values[fresh] = fitness[fresh]
+        improved = targets[fitness[targets] < best_values[targets]]
+        best_positions[improved] = positions[improved]
+        best_values[improved] = fitness[improved]
 
-    def get_local_best(self, candiate: Tuple[float, List], n: int):
-        while n >= len(self.local_best):
-            self.local_best.append((float('inf'), None))
-        if candiate[0] < self.local_best[n][0]:
-            self.local_best[n] = (candiate[0], candiate[1].copy())
-            return candiate[1]
+        best = int(np.argmin(best_values))
+        if best_values[best] < self.global_best_value or self.global_best is None:
+            self.global_best = best_positions[best].copy()
+            self.global_best_value = float(best_values[best])
+        if self.topology == "gbest":
+            social = self.global_best
         else:
-            return self.local_best[n][1]
+            neighbors = self.neighbors(len(population))[targets]
+            social = best_positions[neighbors[np.arange(len(targets)), np.argmin(best_values[neighbors], axis=1)]]
 
-    def velocity(self, n: int):
-        if self.velocity_region is None:
-            print("[INFO] PSO: Setting default velocity region.")
-            self.velocity_region = HCubeRegion([-1] * self.fitness_function.input_dim(),
-                                               [1] * self.fitness_function.input_dim())
-        while n >= len(self.velocities):
-            self.velocities.append(self.velocity_region.get_random_point())
-        return self.velocities[n]
+        x = positions[targets]
+        vel = self.omega * velocities[targets]
+        vel += self.phil * self.rng.random(x.shape) * (best_positions[targets] - x)
+        vel += self.phig * self.rng.random(x.shape) * (social - x)
+        bounds = self.velocity_bounds(population.dim)
+        if bounds is not None:
+            np.clip(vel, bounds[0], bounds[1], out=vel)
+        velocities[targets] = vel
+        positions[targets] = x + vel
+
+    def call_methods(self):
+        if not self.agents:
+            return
+        population, rows = self.swarm()
+        self.move(population, rows, np.arange(len(population)))
+        if population is self.mirror:
+            for agent, row in zip(self.agents, population.positions.tolist()):
+                agent[:] = row
+
+    def method(self, agent, i):
+        population, rows = self.swarm()
+        self.move(population, rows, rows[i:i + 1])
+        agent[:] = population.positions[rows[i]].tolist() if isinstance(agent, list) else population.positions[rows[i]]
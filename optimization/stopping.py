@@ -0,0 +1,111 @@
+class StoppingCriterion:
+    """
+    Decides when OptimizationMethod.start stops. should_stop is called once after every iteration,
+    criteria combine with | (any of them) and & (all of them).
+    """
+
+    def should_stop(self, method) -> bool:
+        raise NotImplementedError('This is an abstract base method')
+
+    def __or__(self, other: 'StoppingCriterion') -> 'AnyCriterion':
+        return AnyCriterion(self, other)
+
+    def __and__(self, other: 'StoppingCriterion') -> 'AllCriteria':
+        return AllCriteria(self, other)
+
+
+class CriteriaGroup(StoppingCriterion):
+    def __init__(self, *criteria: StoppingCriterion):
+        self.criteria = list(criteria)
+
+    def add(self, criterion: StoppingCriterion):
+        """ Adds criterion, criteria of the same type are replaced """
+        self.criteria = [c for c in self.criteria if type(c) is not type(criterion)]
+        self.criteria.append(criterion)
+        return self
+
+    def decisions(self, method):
+        # every criterion is asked, so stateful ones see every iteration
+        return [criterion.should_stop(method) for criterion in self.criteria]
+
+
+class AnyCriterion(CriteriaGroup):
+    """ Stops once any of the criteria says so """
+
+    def should_stop(self, method):
+        return any(self.decisions(method))
+
+
+class AllCriteria(CriteriaGroup):
+    """ Stops once all the criteria say so """
+
+    def should_stop(self, method):
+        return bool(self.criteria) and all(self.decisions(method))
+
+
+class IterationLimit(StoppingCriterion):
+    def __init__(self, iterations: int):
+        self.iterations = iterations
+
+    def should_stop(self, method):
+        return method.iteration == self.iterations
+
+
+class TimeLimit(StoppingCriterion):
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+
+    def should_stop(self, method):
+        return method.runtime > self.seconds
+
+
+class EvaluationLimit(StoppingCriterion):
+    """ Stops after the iteration in which the fitness function was evaluated at least evaluations times """
+
+    def __init__(self, evaluations: int):
+        self.evaluations = evaluations
+
+    def should_stop(self, method):
+        return method.total_evaluations() >= self.evaluations
+
+
+class ValueLimit(StoppingCriterion):
+    """ Stops when the best fitness falls below low or rises above high (we guess the method diverged) """
+
+    def __init__(self, low: float = float('-inf'), high: float = float('inf')):
+        self.low = low
+        self.high = high
+
+    def should_stop(self, method):
+        if method.handler is None:
+            return False
+        best = method.handler.get_best_value()
+        return best < self.low or best > self.high
+
+
+class StagnationLimit(StoppingCriterion):
+    """
+    Stops when the change of fitness values fails to go above given limits for given number of consecutive
+    iterations, for the most changing agent or in total
+    """
+
+    def __init__(self, highest_change: float, highest_total_change: float, iterations: int):
+        self.highest_change = highest_change
+        self.highest_total_change = highest_total_change
+        self.iterations = iterations
+        self.single_turns = 0
+        self.total_turns = 0
+
+    def should_stop(self, method):
+        if self.iterations in (self.single_turns, self.total_turns):
+            return True
+        if method.handler is not None:
+            if method.handler.highest_abschange_vw() < self.highest_change:
+                self.single_turns += 1
+            else:
+                self.single_turns = 0
+            if method.handler.total_abschange_vw() < self.highest_total_change:
+                self.total_turns += 1
+            else:
+                self.total_turns = 0
+        return False
@@ -0,0 +1,167 @@
+import json
+from math import nan
+from typing import List
+
+import numpy as np
+
+FORMAT_VERSION = 1
+FORMAT_NAME = "pmath-trajectory"
+
+
+class TrajectorySink:
+    """ Receives snapshots of the population recorded by OptimizationMethod.start """
+
+    stat_names = ("iteration", "best_value", "avg_value", "evaluations", "runtime")
+
+    def record(self, iteration: int, agents, fitness: np.ndarray, stats: dict):
+        """
+        Records one snapshot
+        :param iteration: Iteration of the snapshot
+        :param agents: Agents of the method, not kept after the call
+        :param fitness: Raw fitness values in the order of agents, nan where unknown
+        :param stats: Per iteration statistics keyed by stat_names
+        """
+        raise NotImplementedError('This is an abstract base method')
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class MemorySink(TrajectorySink):
+    """ Keeps snapshots in memory as lists of lists, like start(save=...) does """
+
+    def __init__(self):
+        self.frames = []  # type: List[List[List[float]]]
+        self.fitness = []  # type: List[np.ndarray]
+        self.stats = []  # type: List[dict]
+
+    def record(self, iteration, agents, fitness, stats):
+        self.frames.append([list(agent) for agent in agents])
+        self.fitness.append(np.array(fitness, dtype=float))
+        self.stats.append(dict(stats))
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __getitem__(self, item):
+        return self.frames[item]
+
+
+class BinaryTrajectorySink(TrajectorySink):
+    """
+    Appends snapshots to a binary file of float64 frames, every frame holds positions, fitness values and stats.
+    A second file indexes the frames by (iteration, offset, agents) int64 rows and a small json file describes
+    the layout. Frames are written as they come, so a trajectory of a crashed run stays readable.
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: Path of the frame file, the index and description are written next to it
+        """
+        self.path = path
+        self.dim = None
+        self.data = None
+        self.index = None
+        self.offset = 0  # in float64 units
+
+    def open(self, dim: int):
+        self.dim = dim
+        with open(self.path + ".json", "w") as file:
+            json.dump({"format": FORMAT_NAME, "version": FORMAT_VERSION, "dim": dim,
+                       "stats": list(self.stat_names)}, file)
+        self.data = open(self.path, "wb")
+        self.index = open(self.path + ".idx", "wb")
+
+    def record(self, iteration, agents, fitness, stats):
+        try:
+            positions = np.asarray(agents, dtype=float)
+        except (TypeError, ValueError):
+            raise TypeError('Only agents being lists of coordinates can be recorded in binary trajectories')
+        positions = positions.reshape(len(positions), -1)
+        if self.data is None:
+            self.open(positions.shape[1])
+        if positions.shape[1] != self.dim:
+            raise ValueError('Agents of dimension {} recorded in trajectory of dimension {}'
+                             .format(positions.shape[1], self.dim))
+
+        frame = np.concatenate([positions.ravel(), np.broadcast_to(np.asarray(fitness, dtype=float), len(positions)),
+                                [stats.get(name, nan) for name in self.stat_names]])
+        frame.tofile(self.data)
+        self.data.flush()
+        np.array([iteration, self.offset, len(positions)], dtype=np.int64).tofile(self.index)
+        self.index.flush()
+        self.offset += len(frame)
+
+    def close(self):
+        for file in (self.data, self.index):
+            if file is not None:
+                file.close()
+        self.data = None
+        self.index = None
+
+
+class TrajectoryReader:
+    """
+    Memory mapped view of a trajectory written by BinaryTrajectorySink, frames are read lazily.
+    Indexing gives (agents, dim) arrays of positions, so the reader can stand in for the list of saved agents.
+    """
+
+    def __init__(self, path: str):
+        with open(path + ".json") as file:
+            meta = json.load(file)
+        if meta.get("format") != FORMAT_NAME:
+            raise ValueError('{} is not a trajectory'.format(path))
+        if meta.get("version") != FORMAT_VERSION:
+            raise ValueError('Unsupported trajectory version: {}'.format(meta.get("version")))
+        self.dim = meta["dim"]
+        self.stat_names = tuple(meta["stats"])
+        self.index = np.fromfile(path + ".idx", dtype=np.int64).reshape(-1, 3)
+        end = self.frame_end(len(self.index) - 1) if len(self.index) else 0
+        self.data = np.memmap(path, dtype=np.float64, mode="r", shape=(end,)) if end else np.empty(0)
+
+    def frame_end(self, i: int) -> int:
+        iteration, offset, count = self.index[i]
+        return int(offset + count * (self.dim + 1) + len(self.stat_names))
+
+    def frame(self, i: int) -> np.ndarray:
+        """ Returns all floats of frame i """
+        return self.data[int(self.index[i][1]):self.frame_end(i)]
+
+    def positions(self, i: int) -> np.ndarray:
+        count = int(self.index[i][2])
+        return self.frame(i)[:count * self.dim].reshape(count, self.dim)
+
+    def fitness(self, i: int) -> np.ndarray:
+        count = int(self.index[i][2])
+        return self.frame(i)[count * self.dim:count * (self.dim + 1)]
+
+    def stats(self, i: int) -> dict:
+        return dict(zip(self.stat_names, self.frame(i)[-len(self.stat_names):].tolist()))
+
+    def stat(self, name: str) -> np.ndarray:
+        """ Returns values of one statistic over all frames """
+        column = self.stat_names.index(name)
+        return np.array([self.frame(i)[column - len(self.stat_names)] for i in range(len(self))])
+
+    def iterations(self) -> np.ndarray:
+        return self.index[:, 0].copy()
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, item):
+        if item < 0:
+            item += len(self)
+        if not 0 <= item < len(self):
+            raise IndexError('Frame index out of range')
+        return self.positions(item)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.positions(i)
@@ -0,0 +1,290 @@
+"""
+
+    Automatic differentiation of MathFunction trees
+
+"""
+from math import log
+from typing import List, Tuple
+
+import numpy as np
+
+from pmath.functions.base_function import MathFunction
+from pmath.functions.evaluation import FunctionEvaluator
+
+forward_mode_limit = 4  # highest input dimension differentiated in forward mode by default
+
+
+def _log(x):
+    if isinstance(x, np.ndarray):
+        return np.log(x)
+    return log(x)
+
+
+class Dual:
+    """
+        Dual number carrying a value together with its gradient with respect to every input.
+        Arithmetic on duals applies the chain rule, plain numbers are treated as constants.
+    """
+    __slots__ = ("value", "grad")
+
+    def __init__(self, value: float, grad: List[float]):
+        self.value = value
+        self.grad = grad
+
+    def chain(self, value: float, slope: float) -> 'Dual':
+        """
+            Returns dual of h(self) where h(self.value) == value and h'(self.value) == slope
+        """
+        return Dual(value, [slope * d for d in self.grad])
+
+    def __add__(self, other):
+        if isinstance(other, Dual):
+            return Dual(self.value + other.value, [l + r for l, r in zip(self.grad, other.grad)])
+        return Dual(self.value + other, self.grad)
+
+    def __radd__(self, other):
+        return Dual(other + self.value, self.grad)
+
+    def __sub__(self, other):
+        if isinstance(other, Dual):
+            return Dual(self.value - other.value, [l - r for l, r in zip(self.grad, other.grad)])
+        return Dual(self.value - other, self.grad)
+
+    def __rsub__(self, other):
+        return Dual(other - self.value, [-d for d in self.grad])
+
+    def __mul__(self, other):
+        if isinstance(other, Dual):
+            a, b = self.value, other.value
+            return Dual(a * b, [l * b + r * a for l, r in zip(self.grad, other.grad)])
+        return Dual(self.value * other, [d * other for d in self.grad])
+
+    def __rmul__(self, other):
+        return Dual(other * self.value, [other * d for d in self.grad])
+
+    def __truediv__(self, other):
+        if isinstance(other, Dual):
+            value = self.value / other.value
+            return Dual(value, [(l - value * r) / other.value for l, r in zip(self.grad, other.grad)])
+        return Dual(self.value / other, [d / other for d in self.grad])
+
+    def __rtruediv__(self, other):
+        value = other / self.value
+        return self.chain(value, -value / self.value)
+
+    def __pow__(self, power, modulo=None):
+        if not isinstance(power, Dual):
+            if power == 0:
+                return self.chain(self.value ** power, 0.)
+            return self.chain(self.value ** power, power * self.value ** (power - 1))
+        value = self.value ** power.value
+        # d(a ** b) = b * a ** (b - 1) da + a ** b * ln(a) db, terms with zero differentials are skipped
+        # so that negative bases still work with constant exponents
+        left = right = 0.
+        if any(power.grad):
+            right = value * _log(self.value)
+        if any(self.grad):
+            left = power.value * self.value ** (power.value - 1)
+        return Dual(value, [left * l + right * r for l, r in zip(self.grad, power.grad)])
+
+    def __rpow__(self, other):
+        value = other ** self.value
+        return self.chain(value, value * _log(other))
+
+    def __neg__(self):
+        return Dual(-self.value, [-d for d in self.grad])
+
+    def __repr__(self):
+        return "Dual({}, {})".format(self.value, self.grad)
+
+
+class ForwardEvaluator(FunctionEvaluator):
+    """ Evaluates a tree over duals, giving value and gradient in one pass (forward mode) """
+
+    def _evaluate(self, func: MathFunction, arguments: List):
+        return func._autodiff(self, arguments)
+
+
+class Tape:
+    """
+        Records every operation of one evaluation together with its local partial derivatives.
+        Gradient of the output with respect to all inputs comes from one backward sweep (reverse mode).
+        Recorded values can be floats or numpy arrays of points.
+    """
+
+    def __init__(self):
+        self.parents = []  # type: List[Tuple]
+        self.constants = []  # type: List[bool]
+
+    def input(self, value) -> 'TapeValue':
+        self.parents.append(())
+        self.constants.append(False)
+        return TapeValue(self, len(self.parents) - 1, value)
+
+    def record(self, value, parents) -> 'TapeValue':
+        """
+            Records value computed from parents
+            :param parents: iterable of (record index, partial derivative of value with respect to the record)
+        """
+        parents = tuple((index, partial) for index, partial in parents if not self.constants[index])
+        self.parents.append(parents)
+        self.constants.append(len(parents) == 0)
+        return TapeValue(self, len(self.parents) - 1, value)
+
+    def gradient(self, output: 'TapeValue', inputs: List['TapeValue']) -> List:
+        """
+            Sweeps the tape backwards from output
+            :returns list of derivatives of output with respect to each input
+        """
+        adjoints = [0.] * len(self.parents)
+        adjoints[output.index] = 1.
+        for i in range(output.index, -1, -1):
+            adjoint = adjoints[i]
+            if type(adjoint) is float and adjoint == 0.:
+                continue
+            for parent, partial in self.parents[i]:
+                adjoints[parent] = adjoints[parent] + adjoint * partial
+        return [adjoints[value.index] for value in inputs]
+
+
+class TapeValue:
+    """ Value recorded on a Tape, arithmetic on tape values records new operations """
+    __slots__ = ("tape", "index", "value")
+
+    def __init__(self, tape: Tape, index: int, value):
+        self.tape = tape
+        self.index = index
+        self.value = value
+
+    def is_constant(self) -> bool:
+        return self.tape.constants[self.index]
+
+    def chain(self, value, slope) -> 'TapeValue':
+        """
+            Returns record of h(self) where h(self.value) == value and h'(self.value) == slope
+        """
+        if type(slope) is float and slope == 0.:
+            return self.tape.record(value, ())
+        return self.tape.record(value, ((self.index, slope),))
+
+    def __add__(self, other):
+        if isinstance(other, TapeValue):
+            return self.tape.record(self.value + other.value, ((self.index, 1.), (other.index, 1.)))
+        return self.tape.record(self.value + other, ((self.index, 1.),))
+
+    def __radd__(self, other):
+        return self.tape.record(other + self.value, ((self.index, 1.),))
+
+    def __sub__(self, other):
+        if isinstance(other, TapeValue):
+            return self.tape.record(self.value - other.value, ((self.index, 1.), (other.index, -1.)))
+        return self.tape.record(self.value - other, ((self.index, 1.),))
+
+    def __rsub__(self, other):
+        return self.tape.record(other - self.value, ((self.index, -1.),))
+
+    def __mul__(self, other):
+        if isinstance(other, TapeValue):
+            return self.tape.record(self.value * other.value, ((self.index, other.value), (other.index, self.value)))
+        return self.tape.record(self.value * other, ((self.index, other),))
+
+    def __rmul__(self, other):
+        return self.tape.record(other * self.value, ((self.index, other),))
+
+    def __truediv__(self, other):
+        if isinstance(other, TapeValue):
+            value = self.value / other.value
+            return self.tape.record(value, ((self.index, 1 / other.value), (other.index, -value / other.value)))
+        return self.tape.record(self.value / other, ((self.index, 1 / other),))
+
+    def __rtruediv__(self, other):
+        value = other / self.value
+        return self.chain(value, -value / self.value)
+
+    def __pow__(self, power, modulo=None):
+        if not isinstance(power, TapeValue):
+            if power == 0:
+                return self.chain(self.value ** power, 0.)
+            return self.chain(self.value ** power, power * self.value ** (power - 1))
+        value = self.value ** power.value
+        # constant records are skipped so that negative bases still work with constant exponents
+        parents = []
+        if not self.is_constant():
+            parents.append((self.index, power.value * self.value ** (power.value - 1)))
+        if not power.is_constant():
+            parents.append((power.index, value * _log(self.value)))
+        return self.tape.record(value, parents)
+
+    def __rpow__(self, other):
+        value = other ** self.value
+        return self.chain(value, value * _log(other))
+
+    def __neg__(self):
+        return self.tape.record(-self.value, ((self.index, -1.),))
+
+    def __repr__(self):
+        return "TapeValue({}, {})".format(self.index, self.value)
+
+
+class ReverseEvaluator(FunctionEvaluator):
+    """ Evaluates a tree over tape values, recording it for a backward sweep (reverse mode) """
+
+    def _evaluate(self, func: MathFunction, arguments: List):
+        return func._autodiff(self, arguments)
+
+
+def value_and_grad(func: MathFunction, point: List[float], mode: str = None) -> Tuple[float, List[float]]:
+    """
+        Evaluates func and its gradient at point
+        :param func: Function to differentiate
+        :param point: Point to differentiate at
+        :param mode: "forward", "reverse" or None for forward mode up to forward_mode_limit inputs
+        :returns tuple(value, gradient)
+    """
+    dim = func.input_dim()
+    if mode is None:
+        mode = "forward" if dim <= forward_mode_limit else "reverse"
+
+    if mode == "reverse":
+        tape = Tape()
+        inputs = [tape.input(point[i]) for i in range(dim)]
+        result = ReverseEvaluator().evaluate(func.shared(), inputs)
+        if not isinstance(result, TapeValue):
+            return result, [0.] * dim
+        return result.value, tape.gradient(result, inputs)
+
+    if mode != "forward":
+        raise ValueError('Unknown autodiff mode: {}'.format(mode))
+    inputs = []
+    for i in range(dim):
+        grad = [0.] * dim
+        grad[i] = 1.
+        inputs.append(Dual(point[i], grad))
+    result = ForwardEvaluator().evaluate(func.shared(), inputs)
+    if not isinstance(result, Dual):
+        return result, [0.] * dim
+    return result.value, result.grad
+
+
+def value_and_grad_batch(func: MathFunction, points) -> Tuple[np.ndarray, np.ndarray]:
+    """
+        Evaluates func and its gradient at every row of points, the tape records whole columns
+        :param func: Function to differentiate
+        :param points: (N, d) array like of points
+        :returns tuple((N,) array of values, (N, d) array of gradients)
+    """
+    points = np.asarray(points, dtype=float)
+    if points.ndim == 1:
+        points = points.reshape(-1, 1)
+    count, dim = points.shape[0], func.input_dim()
+
+    tape = Tape()
+    inputs = [tape.input(points[:, i]) for i in range(dim)]
+    result = ReverseEvaluator().evaluate(func.shared(), inputs)
+    if not isinstance(result, TapeValue):
+        return np.full(count, float(result)), np.zeros((count, dim))
+    values = np.array(np.broadcast_to(result.value, (count,)), dtype=float)
+    grads = np.zeros((count, dim))
+    for i, partial in enumerate(tape.gradient(result, inputs)):
+        grads[:, i] = partial
+    return values, grads
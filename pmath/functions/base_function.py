@@ -1,6 +1,8 @@
 from operator import add, sub, mul, truediv, pow
 from typing import List
 
+import numpy as np
+
 import pmath.functions.ho_function
 
 
@@ -16,8 +18,8 @@ class MathFunction:
     """ Class outlining expected math function interface """
 
     def __init__(self):
-        self.derivative_cache = [None] * self.input_dim()
-        self.integral_cache = [None] * self.input_dim()
+        self.derivative_cache = {}  # variable number -> derivative
+        self.integral_cache = {}  # variable number -> integral
 
     def input_dim(self) -> int:
         """ Outputs number of input dimensions """
@@ -37,18 +39,57 @@ class MathFunction:
         raise NotImplementedError("This method must be overridden")
 
     def derivative(self, variable=None):
-        if variable is None:
-            variable = Variable(0, 1)
-        if self.derivative_cache[variable.num % self.input_dim()] is None:
-            self.derivative_cache[variable.num % self.input_dim()] = self._derivative(variable)
-        return self.derivative_cache[variable.num % self.input_dim()]
+        """
+            Returns simplified derivative of this function, results are memoized per (node, variable)
+            and structurally equal subtrees are differentiated once
+            :param variable: Variable to differentiate by, first one by default
+            :returns MathFunction
+        """
+        return self._memoized("derivative_cache", "_derivative", variable)
 
     def integral(self, variable=None):
-        if variable is None:
-            variable = Variable(0, 1)
-        if self.integral_cache[variable.num % self.input_dim()] is None:
-            self.integral_cache[variable.num % self.input_dim()] = self._integral(variable)
-        return self.integral_cache[variable.num % self.input_dim()]
+        """
+            Returns integral of this function, results are memoized per (node, variable)
+            :param variable: Variable to integrate by, first one by default
+            :raises MathException if no known integral
+            :returns MathFunction
+        """
+        return self._memoized("integral_cache", "_integral", variable)
+
+    def _memoized(self, cache_name: str, method_name: str, variable):
+        """ Looks up or computes derivative or integral of this node and of the nodes it is built from """
+        key = 0 if variable is None else variable.num % self.input_dim()
+        cache = self._cache(cache_name)
+        try:
+            return cache[key]
+        except KeyError:
+            pass
+        if variable is None or variable.num != key or variable.input_dim() != self.input_dim():
+            variable = Variable(key, self.input_dim())
+
+        shared = self.shared()
+        if shared is not self:
+            cache[key] = shared._memoized(cache_name, method_name, variable)
+            return cache[key]
+
+        if method_name == "_derivative":
+            # subtrees are differentiated bottom up first, so the recursion below stays shallow for deep trees
+            from pmath.functions.sharing import postorder
+            pending = lambda node: [] if key in node._cache(cache_name) else node._argument_children()
+            for node in postorder(self, pending)[:-1]:
+                node._memoized(cache_name, method_name, variable)
+            ret = self._derivative(variable).simplify()
+        else:
+            ret = self._integral(variable)
+        cache[key] = ret
+        return ret
+
+    def _cache(self, name: str) -> dict:
+        """ Returns cache dictionary called name, it is created on first use """
+        try:
+            return self.__dict__[name]
+        except KeyError:
+            return self.__dict__.setdefault(name, {})
 
     def _derivative(self, variable):
         """
@@ -68,6 +109,203 @@ class MathFunction:
         """
         raise NotImplementedError("This method must be overridden")
 
+    def children(self) -> List['MathFunction']:
+        """ Returns direct subfunctions of this node """
+        return []
+
+    def _argument_children(self) -> List['MathFunction']:
+        """ Returns children evaluated at the same arguments as this node """
+        return self.children()
+
+    def _rebuild(self, children: List['MathFunction']) -> 'MathFunction':
+        """
+            Returns node of the same kind as this one built on top of given children
+            :param children: replacement for self.children()
+            :returns MathFunction
+        """
+        return self
+
+    def _structural_params(self):
+        """
+            Returns hashable parameters which together with the type and children identify the node.
+            Default one makes the node equal only to itself.
+        """
+        return id(self),
+
+    def shared(self) -> 'MathFunction':
+        """
+            Returns this function with every repeated subtree replaced by a single shared node.
+            The result is cached, trees are not expected to change once built.
+            :returns MathFunction
+        """
+        try:
+            return self._shared_form
+        except AttributeError:
+            pass
+        from pmath.functions.sharing import FunctionTable, share, postorder
+        table = FunctionTable()
+        self._shared_form = share(self, table)
+        # every fully canonical subtree of a shared tree is shared as well
+        for node in postorder(self._shared_form):
+            if table.is_shared(node):
+                node._shared_form = node
+        return self._shared_form
+
+    def structurally_equal(self, other: 'MathFunction') -> bool:
+        from pmath.functions.sharing import FunctionTable
+        table = FunctionTable()
+        return table.intern(self) is table.intern(other)
+
+    def simplify(self) -> 'MathFunction':
+        """
+            Returns algebraically simplified copy of this function.
+            Constants are folded, identities like 0 * f, 1 * f, f + 0 are removed
+            and sums, products and compositions of polynomials are merged into single polynomials.
+            :returns MathFunction
+        """
+        from pmath.functions.simplification import simplify
+        return simplify(self)
+
+    def _simplify(self) -> 'MathFunction':
+        """
+            Applies simplification rules to this node only, children are already simplified
+            :returns MathFunction equal to this one, self if no rule applies
+        """
+        return self
+
+    def compile(self):
+        """
+            Lowers this function into a single generated python function over scalar locals.
+            Nodes without a known lowering are called as they are.
+            :returns CompiledFunction
+        """
+        from pmath.functions.compiler import compile_function
+        return compile_function(self)
+
+    def _compile(self, compiler, arguments):
+        """
+            Emits code evaluating this node, default is a plain call of the node
+            :param compiler: FunctionCompiler
+            :param arguments: names of locals holding the inputs
+            :returns name of the local holding the result
+        """
+        return compiler.local("{}([{}])".format(compiler.constant(self), ", ".join(arguments)))
+
+    def cached(self, max_size: int = 2 ** 16, quantum: float = None):
+        """
+            Returns this function with a position keyed LRU cache of its values
+            :param max_size: Highest number of remembered points
+            :param quantum: Grid step of the keys, None for exact coordinates
+            :returns CachedFunction
+        """
+        from pmath.functions.caching import cached
+        return cached(self, max_size, quantum)
+
+    def evaluate_batch(self, points):
+        """
+            Evaluates this function at every row of points.
+            Points outside of the domain give nan/inf instead of raising.
+            :param points: (N, d) array of points
+            :returns (N,) numpy array of values
+        """
+        from pmath.functions.evaluation import evaluate_batch
+        return evaluate_batch(self, points)
+
+    def _evaluate_batch(self, evaluator, arguments):
+        """
+            Evaluates this node over whole columns, default calls the node point by point
+            :param evaluator: BatchEvaluator
+            :param arguments: list of numpy arrays, one per input dimension
+            :returns numpy array of values
+        """
+        rows = np.column_stack(np.broadcast_arrays(*arguments))
+        return np.fromiter((self(list(row)) for row in rows), dtype=float, count=len(rows))
+
+    def evaluate_interval(self, region):
+        """
+            Bounds this function over a box
+            :param region: HCubeRegion
+            :returns Interval containing every value of the function over the region
+        """
+        from pmath.functions.interval import evaluate_interval
+        return evaluate_interval(self, region)
+
+    def _evaluate_interval(self, evaluator, arguments):
+        """
+            Evaluates this node over intervals, default knows nothing about the node
+            :param evaluator: IntervalEvaluator
+            :param arguments: list of Interval, one per input dimension
+            :returns Interval
+        """
+        from pmath.functions.interval import Interval
+        return Interval.everything()
+
+    def serialize(self):
+        """
+            Returns compact versioned form of this function, cheap to pickle and to rebuild in another process
+            :returns SerializedFunction
+        """
+        from pmath.functions.serialization import serialize
+        return serialize(self)
+
+    def _serialize(self, writer):
+        """
+            Returns instruction rebuilding this node, default one pickles the node as it is
+            :param writer: FunctionWriter, writer.ref(child) gives slot of an already written child
+            :returns tuple(opcode, *operands)
+        """
+        return "object", self
+
+    def value_and_grad(self, point: List[float], mode: str = None):
+        """
+            Evaluates this function and its gradient at point in one pass of automatic differentiation
+            :param point: Point to differentiate at
+            :param mode: "forward", "reverse" or None to pick by input dimension
+            :returns tuple(value, gradient list)
+        """
+        from pmath.functions.autodiff import value_and_grad
+        return value_and_grad(self, point, mode)
+
+    def gradient(self, point: List[float], mode: str = None) -> List[float]:
+        """
+            Returns gradient of this function at point (automatic differentiation)
+            :param point: Point to differentiate at
+            :param mode: "forward", "reverse" or None to pick by input dimension
+            :returns List[float]
+        """
+        return self.value_and_grad(point, mode)[1]
+
+    def value_and_grad_batch(self, points):
+        """
+            Evaluates this function and its gradient at every row of points (reverse mode over numpy arrays)
+            :param points: (N, d) array of points
+            :returns tuple((N,) array of values, (N, d) array of gradients)
+        """
+        from pmath.functions.autodiff import value_and_grad_batch
+        return value_and_grad_batch(self, points)
+
+    def _autodiff(self, evaluator, arguments):
+        """
+            Evaluates this node over autodiff values (Dual or TapeValue holding floats or numpy arrays),
+            default uses symbolic partial derivatives of the node
+            :param evaluator: ForwardEvaluator or ReverseEvaluator
+            :param arguments: list of autodiff values, one per input dimension
+            :returns autodiff value
+        """
+        values = [argument.value for argument in arguments]
+
+        def at(func):
+            if isinstance(values[0], np.ndarray):
+                from pmath.functions.evaluation import BatchEvaluator
+                return BatchEvaluator().evaluate(func, values)
+            return func(values)
+
+        ret = arguments[0].chain(at(self), 0.)
+        for i, argument in enumerate(arguments):
+            slope = at(self.derivative(Variable(i, len(arguments))))
+            ret = ret + argument.chain(0., slope)
+        return ret
+
     def is_constant(self, variable):
         return False
 
@@ -136,9 +374,71 @@ class MathFunction:
         return pmath.functions.base_function.FunctionDivision(other, self)
 
 
+_operator_symbols = {add: "+", sub: "-", mul: "*", truediv: "/", pow: "**"}
+
+
+def _constant_value(func: MathFunction):
+    """ Returns value of func if it is a constant polynomial (possibly composed with something), None otherwise """
+    while isinstance(func, FunctionComposiiton):
+        func = func.f
+    if isinstance(func, pmath.functions.elementary_functions.Polynomial):
+        if all(mul == 0 for mul in func.multipliers[1:]):
+            return func.multipliers[0]
+    return None
+
+
+def _constant_like(func: MathFunction, value) -> MathFunction:
+    """ Returns constant function with the same input dimension as func """
+    constant = pmath.functions.elementary_functions.Polynomial([value])
+    if func.input_dim() == 1:
+        return constant
+    return FunctionComposiiton(constant, Variable(0, func.input_dim()))
+
+
+def _polynomial_form(func: MathFunction):
+    """
+        Returns (P, inner) such that func == P o inner, inner is None for constants
+        and func itself is returned as inner for plain polynomials. None if there is no such form.
+    """
+    Polynomial = pmath.functions.elementary_functions.Polynomial
+    value = _constant_value(func)
+    if value is not None:
+        return Polynomial([value]), None
+    if isinstance(func, Polynomial):
+        return func, Polynomial
+    if isinstance(func, FunctionComposiiton) and isinstance(func.f, Polynomial):
+        return func.f, func.g
+    return None
+
+
+def _merge_polynomials(f: MathFunction, g: MathFunction, merge):
+    """
+        Merges P o h and Q o h into merge(P, Q) o h, constants merge with any form
+        :returns MathFunction or None if f and g can't be merged
+    """
+    f_form, g_form = _polynomial_form(f), _polynomial_form(g)
+    if f_form is None or g_form is None:
+        return None
+    (p, p_inner), (q, q_inner) = f_form, g_form
+    if p_inner is None:
+        inner = q_inner
+    elif q_inner is None or p_inner is q_inner:
+        inner = p_inner
+    else:
+        return None
+    if inner is None:
+        return None
+    merged = merge(p, q)
+    if inner is pmath.functions.elementary_functions.Polynomial:
+        return merged
+    return FunctionComposiiton(merged, inner)
+
+
 class HOBinaryFunction(MathFunction):
     """ (f op g)(...) """
 
+    opcode = None  # name of the node in serialized functions, None for arbitrary operations
+
     def __init__(self, f: MathFunction, g: MathFunction, operation):
         self.f = f  # type: MathFunction
         self.g = g  # type: MathFunction
@@ -157,51 +457,127 @@ class HOBinaryFunction(MathFunction):
     def input_dim(self) -> int:
         return self.f.input_dim()
 
+    def children(self):
+        return [self.f, self.g]
+
+    def _rebuild(self, children):
+        f, g = children
+        if type(self) is HOBinaryFunction:
+            return HOBinaryFunction(f, g, self.op)
+        return type(self)(f, g)
+
+    def _structural_params(self):
+        return self.op,
+
+    def _simplify(self):
+        left, right = _constant_value(self.f), _constant_value(self.g)
+        if left is not None and right is not None:
+            try:
+                value = self.op(left, right)
+            except (ArithmeticError, ValueError):
+                return self
+            if not isinstance(value, complex):
+                return _constant_like(self, value)
+        return self
+
     def __call__(self, arguments: List[float]) -> float:
         return self.op(self.f(arguments),
                        self.g(arguments))
 
+    def _compile(self, compiler, arguments):
+        f = compiler.emit(self.f, arguments)
+        g = compiler.emit(self.g, arguments)
+        try:
+            return compiler.local("{} {} {}".format(f, _operator_symbols[self.op], g))
+        except KeyError:
+            return compiler.local("{}({}, {})".format(compiler.constant(self.op), f, g))
+
+    def _evaluate_batch(self, evaluator, arguments):
+        return self.op(evaluator.evaluate(self.f, arguments),
+                       evaluator.evaluate(self.g, arguments))
+
+    def _autodiff(self, evaluator, arguments):
+        return self.op(evaluator.evaluate(self.f, arguments),
+                       evaluator.evaluate(self.g, arguments))
+
+    def _serialize(self, writer):
+        if self.opcode is None:
+            return super()._serialize(writer)
+        return self.opcode, writer.ref(self.f), writer.ref(self.g)
+
+    def _evaluate_interval(self, evaluator, arguments):
+        if self.op not in _operator_symbols:
+            return super()._evaluate_interval(evaluator, arguments)
+        return self.op(evaluator.evaluate(self.f, arguments),
+                       evaluator.evaluate(self.g, arguments))
+
 
 class FunctionSum(HOBinaryFunction):
     """ (f + g) """
 
+    opcode = "sum"
+
     def __init__(self, f: MathFunction, g: MathFunction):
         super().__init__(f, g, add)
 
     def _derivative(self, variable):
-        return self.f._derivative(variable) + self.g._derivative(variable)
+        return self.f.derivative(variable) + self.g.derivative(variable)
 
     def _integral(self, variable):
-        return self.f._integral(variable) + self.g._integral(variable)
+        return self.f.integral(variable) + self.g.integral(variable)
 
     def __str__(self):
         return "(" + str(self.f) + ") + (" + str(self.g) + ")"
 
+    def _simplify(self):
+        if _constant_value(self.f) == 0:
+            return self.g
+        if _constant_value(self.g) == 0:
+            return self.f
+        merged = _merge_polynomials(self.f, self.g, lambda p, q: p.combine(q, add))
+        if merged is not None:
+            return merged
+        return super()._simplify()
+
 
 class FunctionSubtraction(HOBinaryFunction):
     """ (f + g) """
 
+    opcode = "sub"
+
     def __init__(self, f: MathFunction, g: MathFunction):
         super().__init__(f, g, sub)
 
     def _derivative(self, variable):
-        return self.f._derivative(variable) - self.g._derivative(variable)
+        return self.f.derivative(variable) - self.g.derivative(variable)
 
     def _integral(self, variable):
-        return self.f._integral(variable) - self.g._integral(variable)
+        return self.f.integral(variable) - self.g.integral(variable)
 
     def __str__(self):
         return "(" + str(self.f) + ") - (" + str(self.g) + ")"
 
+    def _simplify(self):
+        if _constant_value(self.g) == 0:
+            return self.f
+        merged = _merge_polynomials(self.f, self.g, lambda p, q: p.combine(q, sub))
+        if merged is not None:
+            return merged
+        if _constant_value(self.f) == 0:
+            return FunctionComposiiton(pmath.functions.elementary_functions.Polynomial([0, -1]), self.g)
+        return super()._simplify()
+
 
 class FunctionMultiplication(HOBinaryFunction):
     """ (f * g) """
 
+    opcode = "mul"
+
     def __init__(self, f: MathFunction, g: MathFunction):
         super().__init__(f, g, mul)
 
     def _derivative(self, variable):
-        return self.f._derivative(variable) * self.g + self.g._derivative(variable) * self.f
+        return self.f.derivative(variable) * self.g + self.g.derivative(variable) * self.f
 
     def _integral(self, variable):
         raise MathException("No generic analytic integration method known :(")
@@ -209,10 +585,25 @@ class FunctionMultiplication(HOBinaryFunction):
     def __str__(self):
         return "(" + str(self.f) + ") * (" + str(self.g) + ")"
 
+    def _simplify(self):
+        left, right = _constant_value(self.f), _constant_value(self.g)
+        if left == 0 or right == 0:
+            return _constant_like(self, 0)
+        if left == 1:
+            return self.g
+        if right == 1:
+            return self.f
+        merged = _merge_polynomials(self.f, self.g, lambda p, q: p.multiply(q))
+        if merged is not None:
+            return merged
+        return super()._simplify()
+
 
 class FunctionDivision(HOBinaryFunction):
     """ (f / g) """
 
+    opcode = "div"
+
     def __init__(self, f: MathFunction, g: MathFunction):
         super().__init__(f, g, truediv)
 
@@ -220,15 +611,31 @@ class FunctionDivision(HOBinaryFunction):
         raise MathException("No generic analytic integration method known :(")
 
     def _derivative(self, variable):
-        return (self.f._derivative(variable) * self.g - self.g._derivative(variable) * self.f) / (self.g * self.g)
+        return (self.f.derivative(variable) * self.g - self.g.derivative(variable) * self.f) / (self.g * self.g)
 
     def __str__(self):
         return "(" + str(self.f) + ") / (" + str(self.g) + ")"
 
+    def _simplify(self):
+        left, right = _constant_value(self.f), _constant_value(self.g)
+        if right == 1:
+            return self.f
+        if left == 0 and right != 0:
+            return _constant_like(self, 0)
+        if right is not None and right != 0:
+            Polynomial = pmath.functions.elementary_functions.Polynomial
+            merged = _merge_polynomials(self.f, self.g, lambda p, q: p.multiply(Polynomial([1 / right])))
+            if merged is not None:
+                return merged
+        return super()._simplify()
+
 
 class FunctionPower(HOBinaryFunction):
     """ (f ** g) """
 
+    opcode = "pow"
+    expand_limit = 8  # highest integer power of a polynomial expanded by simplify
+
     def __init__(self, f: MathFunction, g: MathFunction):
         super().__init__(f, g, pow)
 
@@ -238,15 +645,26 @@ class FunctionPower(HOBinaryFunction):
     def _derivative(self, variable):
         g = self.g
         f = self.f
-        from pmath.functions.elementary_functions import Polynomial
-        one = Polynomial([1])
+        one = _constant_like(g, 1)
         from pmath.functions.elementary_functions import Log
-        return g * (f ** (g - one)) * f._derivative(variable) + \
-               (f ** g) * ((Log()) @ f) * g._derivative(variable)
+        return g * (f ** (g - one)) * f.derivative(variable) + \
+               self * ((Log()) @ f) * g.derivative(variable)
 
     def __str__(self):
         return "(" + str(self.f) + ") ** (" + str(self.g) + ")"
 
+    def _simplify(self):
+        left, right = _constant_value(self.f), _constant_value(self.g)
+        if right == 0 or left == 1:
+            return _constant_like(self, 1)
+        if right == 1:
+            return self.f
+        if right is not None and 0 < right <= FunctionPower.expand_limit and right == int(right):
+            merged = _merge_polynomials(self.f, self.g, lambda p, q: p.power(int(right)))
+            if merged is not None:
+                return merged
+        return super()._simplify()
+
     def __call__(self, arguments: List[float]) -> float:
         return self.f(arguments)**self.g(arguments)
 
@@ -268,11 +686,63 @@ class FunctionComposiiton(MathFunction):
     def __str__(self):
         return "(" + str(self.f) + ") o (" + str(self.g) + ")"
 
+    def children(self):
+        return [self.f, self.g]
+
+    def _argument_children(self):
+        return [self.g]
+
+    def _rebuild(self, children):
+        return FunctionComposiiton(*children)
+
+    def _structural_params(self):
+        return ()
+
+    def _simplify(self):
+        elementary_functions = pmath.functions.elementary_functions
+        Polynomial = elementary_functions.Polynomial
+        value = _constant_value(self.f)
+        if value is not None:
+            return _constant_like(self, value)
+
+        value = _constant_value(self.g)
+        if value is not None and isinstance(self.f, (Polynomial, elementary_functions.ElementaryFunction)):
+            try:
+                return _constant_like(self, self.f([value]))
+            except (ArithmeticError, ValueError):
+                return self
+
+        if isinstance(self.f, Polynomial):
+            if list(self.f.multipliers) == [0, 1]:
+                return self.g
+            if isinstance(self.g, Polynomial):
+                return self.f.compose(self.g)
+            if isinstance(self.g, FunctionComposiiton) and isinstance(self.g.f, Polynomial):
+                return FunctionComposiiton(self.f.compose(self.g.f), self.g.g)
+        if isinstance(self.g, Polynomial) and list(self.g.multipliers) == [0, 1]:
+            return self.f
+        return self
+
+    def _compile(self, compiler, arguments):
+        return compiler.emit(self.f, [compiler.emit(self.g, arguments)])
+
+    def _evaluate_batch(self, evaluator, arguments):
+        return evaluator.evaluate(self.f, [evaluator.evaluate(self.g, arguments)])
+
+    def _autodiff(self, evaluator, arguments):
+        return evaluator.evaluate(self.f, [evaluator.evaluate(self.g, arguments)])
+
+    def _evaluate_interval(self, evaluator, arguments):
+        return evaluator.evaluate(self.f, [evaluator.evaluate(self.g, arguments)])
+
+    def _serialize(self, writer):
+        return "compose", writer.ref(self.f), writer.ref(self.g)
+
     def _derivative(self, variable):
         """ (f o g)' = g' * (f' o g)
         :param variable:
         """
-        return self.g._derivative(variable) * FunctionComposiiton(self.f._derivative(variable), self.g)
+        return self.g.derivative(variable) * FunctionComposiiton(self.f.derivative(), self.g)
 
     def _integral(self, variable):
         if self.g.is_constant(variable):
@@ -308,8 +778,31 @@ class Variable(MathFunction):
     def __call__(self, arguments: List[float]) -> float:
         return arguments[self.num]
 
-    def _derivative(self, variable=None):
-        return pmath.functions.elementary_functions.Polynomial.XX @ self
+    def _structural_params(self):
+        return self.num, self.max
+
+    def _compile(self, compiler, arguments):
+        return arguments[self.num]
+
+    def _evaluate_batch(self, evaluator, arguments):
+        return arguments[self.num]
+
+    def _autodiff(self, evaluator, arguments):
+        return arguments[self.num]
+
+    def _evaluate_interval(self, evaluator, arguments):
+        return arguments[self.num]
+
+    def _serialize(self, writer):
+        return "var", self.num, self.max, self.letter
+
+    def _derivative(self, variable):
+        return _constant_like(self, 1. if self.num == variable.num else 0.)
+
+    def _integral(self, variable):
+        if self.num == variable.num:
+            return pmath.functions.elementary_functions.Polynomial([0, 0, 0.5]) @ self
+        return self * variable
 
     def __str__(self):
         return self.letter
@@ -0,0 +1,147 @@
+"""
+
+    Position keyed evaluation cache
+
+"""
+from collections import OrderedDict
+from typing import List
+
+import numpy as np
+
+from pmath.functions.base_function import MathFunction
+
+
+class CachedFunction(MathFunction):
+    """
+        Remembers values of a function at recently evaluated points, least recently used points are evicted first.
+        Points are keyed by their exact coordinates, or by the cell of a grid of given step if quantum is set,
+        in which case all points of a cell share the value of the first one evaluated.
+        The source can be any callable taking a list of coordinates.
+    """
+
+    def __init__(self, source, max_size: int = 2 ** 16, quantum: float = None):
+        """
+        :param source: Function or any callable to cache
+        :param max_size: Highest number of remembered points
+        :param quantum: Grid step of the keys, None for exact coordinates
+        """
+        self.source = source
+        self.max_size = max_size
+        self.quantum = quantum
+        self.values = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        super().__init__()
+
+    def key(self, arguments) -> tuple:
+        """ Returns cache key of a point """
+        if self.quantum is None:
+            return tuple(float(x) for x in arguments)
+        return tuple(round(x / self.quantum) for x in arguments)
+
+    def lookup(self, key):
+        """ Returns remembered value for key and marks it as recently used, None if there is none """
+        try:
+            value = self.values[key]
+        except KeyError:
+            self.misses += 1
+            return None
+        self.values.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def store(self, key, value):
+        self.values[key] = value
+        if len(self.values) > self.max_size:
+            self.values.popitem(last=False)
+            self.evictions += 1
+
+    def __call__(self, arguments: List[float]) -> float:
+        key = self.key(arguments)
+        value = self.lookup(key)
+        if value is None:
+            value = self.source(arguments)
+            self.store(key, value)
+        return value
+
+    def _evaluate_batch(self, evaluator, arguments):
+        rows = np.column_stack(np.broadcast_arrays(*arguments))
+        keys = [self.key(row) for row in rows.tolist()]
+        values = np.empty(len(rows))
+        missing = []
+        for i, key in enumerate(keys):
+            value = self.lookup(key)
+            if value is None:
+                missing.append(i)
+            else:
+                values[i] = value
+        if missing:
+            if isinstance(self.source, MathFunction):
+                columns = [rows[missing, j] for j in range(rows.shape[1])]
+                computed = np.broadcast_to(evaluator.evaluate(self.source, columns), (len(missing),))
+            else:
+                computed = [self.source(list(rows[i])) for i in missing]
+            for i, value in zip(missing, computed):
+                values[i] = value
+                self.store(keys[i], float(value))
+        return values
+
+    def hit_rate(self) -> float:
+        """ Returns fraction of lookups answered from the cache """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def statistics(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "size": len(self.values), "hit_rate": self.hit_rate()}
+
+    def clear(self):
+        """ Forgets every remembered point, statistics are kept """
+        self.values.clear()
+
+    def input_dim(self) -> int:
+        return self.source.input_dim()
+
+    def output_dim(self) -> int:
+        return self.source.output_dim()
+
+    def _derivative(self, variable):
+        return self.source.derivative(variable)
+
+    def _integral(self, variable):
+        return self.source.integral(variable)
+
+    def children(self):
+        if isinstance(self.source, MathFunction):
+            return [self.source]
+        return []
+
+    def _argument_children(self):
+        # the source is evaluated at the missing points only
+        return []
+
+    def _rebuild(self, children):
+        # the rebuilt function computes the same values, so it shares the remembered points
+        rebuilt = CachedFunction(children[0], self.max_size, self.quantum)
+        rebuilt.values = self.values
+        return rebuilt
+
+    def _evaluate_interval(self, evaluator, arguments):
+        if isinstance(self.source, MathFunction):
+            return evaluator.evaluate(self.source, arguments)
+        return super()._evaluate_interval(evaluator, arguments)
+
+    def __str__(self):
+        return str(self.source)
+
+
+def cached(func, max_size: int = 2 ** 16, quantum: float = None) -> CachedFunction:
+    """
+        Wraps func into a position keyed cache
+        :param func: Function or any callable to cache
+        :param max_size: Highest number of remembered points
+        :param quantum: Grid step of the keys, None for exact coordinates
+        :returns CachedFunction
+    """
+    return CachedFunction(func, max_size, quantum)
@@ -0,0 +1,153 @@
+"""
+
+    MathFunction -> flat python function compiler
+
+"""
+from typing import List
+
+from pmath.functions.base_function import MathFunction
+from pmath.functions.sharing import postorder
+
+
+class FunctionCompiler:
+    """
+        Lowers a function tree into the body of a single python function.
+        The tree is shared first (see MathFunction.shared), so every structurally distinct subtree
+        is evaluated once into a scalar local. Nodes that don't know
+        how to lower themselves are bound as constants and called as they are.
+    """
+
+    def __init__(self):
+        self.lines = []  # type: List[str]
+        self.namespace = {}
+        self.emitted = {}
+        self.locals = 0
+
+    def constant(self, value) -> str:
+        """
+            Binds value in the namespace of the generated function
+            :returns name of the binding
+        """
+        name = "_c{}".format(len(self.namespace))
+        self.namespace[name] = value
+        return name
+
+    def local(self, expression: str) -> str:
+        """
+            Assigns expression to a fresh local
+            :returns name of the local
+        """
+        name = "_t{}".format(self.locals)
+        self.locals += 1
+        self.lines.append("    {} = {}".format(name, expression))
+        return name
+
+    def number(self, value) -> str:
+        """ Returns literal for value, falls back to a binding for inf/nan """
+        value = float(value)
+        if value != value or value in (float('inf'), float('-inf')):
+            return self.constant(value)
+        return repr(value)
+
+    def emit(self, func: MathFunction, arguments: List[str]) -> str:
+        """
+            Emits code evaluating func at arguments, each (node, arguments) pair is emitted once
+            :param func: Node to emit
+            :param arguments: Names of locals holding the node inputs
+            :returns name of the local holding the result
+        """
+        key = (id(func), id(arguments))
+        try:
+            return self.emitted[key][0]
+        except KeyError:
+            pass
+        name = func._compile(self, arguments)
+        # func and arguments are kept alive so their ids can't be reused
+        self.emitted[key] = (name, func, arguments)
+        return name
+
+    def compile(self, func: MathFunction) -> 'CompiledFunction':
+        arguments = []
+        for i in range(func.input_dim()):
+            arguments.append("_x{}".format(i))
+            self.lines.append("    _x{0} = arguments[{0}]".format(i))
+        # subtrees are emitted bottom up first, so the recursion in emit stays shallow for deep trees
+        source, func = func, func.shared()
+        for node in postorder(func, lambda node: node._argument_children()):
+            self.emit(node, arguments)
+        result = self.emit(func, arguments)
+        code = "def compiled(arguments):\n" + "\n".join(self.lines) + "\n    return {}\n".format(result)
+
+        namespace = dict(self.namespace)
+        exec(compile(code, "<compiled MathFunction>", "exec"), namespace)
+        return CompiledFunction(source, namespace["compiled"], code)
+
+
+class CompiledFunction(MathFunction):
+    """ Generated python function that behaves like the tree it was compiled from """
+
+    def __init__(self, source: MathFunction, function, code: str):
+        self.source = source
+        self.function = function
+        self.code = code
+        super().__init__()
+
+    def input_dim(self) -> int:
+        return self.source.input_dim()
+
+    def output_dim(self) -> int:
+        return self.source.output_dim()
+
+    def __call__(self, arguments: List[float]) -> float:
+        return self.function(arguments)
+
+    def _derivative(self, variable):
+        return self.source.derivative(variable)
+
+    def _integral(self, variable):
+        return self.source.integral(variable)
+
+    def children(self):
+        return [self.source]
+
+    def _rebuild(self, children):
+        return CompiledFunction(children[0], self.function, self.code)
+
+    def _compile(self, compiler, arguments):
+        return compiler.emit(self.source, arguments)
+
+    def _evaluate_batch(self, evaluator, arguments):
+        return evaluator.evaluate(self.source, arguments)
+
+    def _autodiff(self, evaluator, arguments):
+        return evaluator.evaluate(self.source, arguments)
+
+    def _evaluate_interval(self, evaluator, arguments):
+        return evaluator.evaluate(self.source, arguments)
+
+    def _serialize(self, writer):
+        return "compiled", writer.ref(self.source)
+
+    def compile(self):
+        return self
+
+    def is_constant(self, variable):
+        return self.source.is_constant(variable)
+
+    def is_zero(self):
+        return self.source.is_zero()
+
+    def is_variable(self, variable):
+        return self.source.is_variable(variable)
+
+    def __str__(self):
+        return str(self.source)
+
+
+def compile_function(func: MathFunction) -> CompiledFunction:
+    """
+        Compiles func into a single python function over scalar locals
+        :param func: Function to compile
+        :returns CompiledFunction
+    """
+    return FunctionCompiler().compile(func)
@@ -1,15 +1,20 @@
-from copy import copy
-from math import cos, exp, erf, pi
+from array import array
+from math import cos, exp, erf, inf, pi, sqrt
 from math import log
 from math import sin
 from typing import List
 
+import numpy as np
+
 from pmath.functions.base_function import MathFunction
+from pmath.functions.interval import Interval, exp_range, log_range, periodic_range
 
 
 class ElementaryFunction(MathFunction):
     """ This class is a base for all elementary functions"""
 
+    ufunc = None  # numpy counterpart of func used in batch evaluation
+
     def __init__(self, func):
         super().__init__()
         self.func = func
@@ -23,12 +28,52 @@ class ElementaryFunction(MathFunction):
     def __call__(self, arguments: List[float]) -> float:
         return self.func(arguments[0])
 
+    def _structural_params(self):
+        return self.func,
+
+    def _compile(self, compiler, arguments):
+        return compiler.local("{}({})".format(compiler.constant(self.func), arguments[0]))
+
+    def _evaluate_batch(self, evaluator, arguments):
+        if self.ufunc is None:
+            return np.vectorize(self.func, otypes=[float])(arguments[0])
+        return self.ufunc(arguments[0])
+
+    def _autodiff(self, evaluator, arguments):
+        x = arguments[0]
+        if isinstance(x.value, np.ndarray):
+            return x.chain(self._evaluate_batch(evaluator, [x.value]), self._batch_slope(x.value))
+        return x.chain(self.func(x.value), self._slope(x.value))
+
+    def _evaluate_interval(self, evaluator, arguments):
+        return self._range(arguments[0])
+
+    def _serialize(self, writer):
+        if type(self) is ElementaryFunction:
+            return super()._serialize(writer)
+        return "elem", type(self).__name__
+
+    def _range(self, x: Interval) -> Interval:
+        """ Returns interval containing values of the function over x """
+        return Interval.everything()
+
+    def _slope(self, x: float) -> float:
+        """ Returns value of the derivative at x """
+        return self.derivative()([x])
+
+    def _batch_slope(self, x: np.ndarray) -> np.ndarray:
+        """ Returns values of the derivative at every element of x """
+        return self.derivative().evaluate_batch(x)
+
     def __str__(self):
         return self.func.__name__
 
 
 class Polynomial(MathFunction):
-    """ This class represents a R->R polynomial of any degree """
+    """
+        This class represents a R->R polynomial of any degree.
+        Coefficients are kept in a compact array of doubles and evaluated with Horner's scheme.
+    """
 
     def __init__(self, multipliers: List[float]):
         """
@@ -38,7 +83,12 @@ class Polynomial(MathFunction):
         """
         if len(multipliers) == 0:
             multipliers = [0]
-        self.multipliers = copy(multipliers)
+        self.multipliers = array('d', multipliers)
+        # (n, c) if the polynomial is c*x**n, such polynomials are evaluated without the Horner loop
+        self.monomial = None
+        degree = self.degree()
+        if degree > 0 and not any(self.multipliers[:degree]):
+            self.monomial = (degree, self.multipliers[degree])
 
     def _next_nonzero_mul(self, arr, pos):
         for i in range(len(arr) - pos):
@@ -51,7 +101,7 @@ class Polynomial(MathFunction):
         for i, mul in enumerate(self.multipliers):
             if mul == 0:
                 continue
-            ret += str(abs(mul))
+            ret += str(abs(int(mul) if mul.is_integer() and abs(mul) < 1e15 else mul))
             if i != 0:
                 ret += "x**" + str(i)
             next_mul = self._next_nonzero_mul(self.multipliers, i + 1)
@@ -69,24 +119,157 @@ class Polynomial(MathFunction):
         return 1
 
     def _derivative(self, variable):
-        new_muls = copy(self.multipliers)
-        for i in range(len(new_muls)):
-            new_muls[i] *= i
-        return Polynomial(new_muls[1:])
+        return Polynomial([i * mul for i, mul in enumerate(self.multipliers)][1:])
 
     def _integral(self, variable):
-        new_muls = [0]
-        for i in range(len(self.multipliers)):
-            new_muls.append((1 / (1 + i)) * self.multipliers[i])
-        return Polynomial(new_muls)
+        return Polynomial([0.] + [mul / (i + 1) for i, mul in enumerate(self.multipliers)])
 
     def __call__(self, arguments: List[float]) -> float:
+        x = arguments[0]
+        if self.monomial is not None:
+            n, mul = self.monomial
+            value = x * x if n == 2 else x ** n
+            return value if mul == 1 else mul * value
+
+        muls = self.multipliers
+        ret = muls[-1]
+        for i in range(len(muls) - 2, -1, -1):
+            ret = ret * x + muls[i]
+        return ret
 
-        ret = 0.
-        for i, mul in enumerate(self.multipliers):
-            ret += mul * arguments[0] ** i
+    def _structural_params(self):
+        return tuple(self.multipliers)
+
+    def combine(self, other: 'Polynomial', op) -> 'Polynomial':
+        """
+            Adds or subtracts other coefficient wise
+            :param op: operator.add or operator.sub
+        """
+        length = max(len(self.multipliers), len(other.multipliers))
+        left = list(self.multipliers) + [0] * (length - len(self.multipliers))
+        right = list(other.multipliers) + [0] * (length - len(other.multipliers))
+        return Polynomial([op(l, r) for l, r in zip(left, right)])
+
+    def multiply(self, other: 'Polynomial') -> 'Polynomial':
+        return Polynomial(_convolve(self.multipliers, other.multipliers))
+
+    def power(self, n: int) -> 'Polynomial':
+        new_muls = [1.]
+        for i in range(n):
+            new_muls = _convolve(new_muls, self.multipliers)
+        return Polynomial(new_muls)
+
+    def compose(self, other: 'Polynomial') -> 'Polynomial':
+        """ Returns polynomial self(other(x)), computed by Horner's scheme on coefficient lists """
+        new_muls = [self.multipliers[-1]]
+        for mul in reversed(self.multipliers[:-1]):
+            new_muls = _convolve(new_muls, other.multipliers)
+            new_muls[0] += mul
+        return Polynomial(new_muls)
+
+    def degree(self) -> int:
+        degree = len(self.multipliers) - 1
+        while degree > 0 and self.multipliers[degree] == 0:
+            degree -= 1
+        return degree
+
+    def _simplify(self):
+        if self.degree() < len(self.multipliers) - 1:
+            return Polynomial(self.multipliers[:self.degree() + 1])
+        return self
+
+    def _compile(self, compiler, arguments):
+        """ Emits the polynomial in Horner form, zero terms are skipped and monomials are expanded """
+        x = arguments[0]
+        if self.monomial is not None:
+            n, mul = self.monomial
+            expression = " * ".join([x] * n) if n <= 4 else "{} ** {}".format(x, n)
+            if mul != 1:
+                expression = "{} * {}".format(compiler.number(mul), expression)
+            return compiler.local(expression)
+
+        degree = self.degree()
+        expression = compiler.number(self.multipliers[degree])
+        for mul in reversed(self.multipliers[:degree]):
+            expression = "({}) * {}".format(expression, x)
+            if mul != 0:
+                expression += " + " + compiler.number(mul)
+        return compiler.local(expression)
+
+    def _evaluate_batch(self, evaluator, arguments):
+        x = arguments[0]
+        if self.monomial is not None:
+            n, mul = self.monomial
+            value = x * x if n == 2 else x ** n
+            return value if mul == 1 else mul * value
+
+        ret = np.full(np.shape(x), self.multipliers[-1])
+        for mul in reversed(self.multipliers[:-1]):
+            ret *= x
+            ret += mul
         return ret
 
+    def _autodiff(self, evaluator, arguments):
+        x = arguments[0]
+        return x.chain(*self.value_and_slope(x.value))
+
+    def _evaluate_interval(self, evaluator, arguments):
+        """
+            Bounds the polynomial, the bounds are exact up to rounding where the polynomial is monotone.
+            Elsewhere both the power sum and the Taylor expansion around the middle of x are bounded
+            and the tighter ends are taken, the latter shrinks quadratically with x around extremes.
+        """
+        x = arguments[0]
+        slope = _power_sum([i * mul for i, mul in enumerate(self.multipliers)][1:], x)
+        if slope.low >= 0 or slope.high <= 0:
+            low = _power_sum(self.multipliers, Interval(x.low))
+            high = _power_sum(self.multipliers, Interval(x.high))
+            return Interval(min(low.low, high.low), max(low.high, high.high))
+
+        ret = _power_sum(self.multipliers, x)
+        middle = x.mid()
+        if x.width() == inf or x.width() != x.width():
+            return ret
+        # coefficients of p(middle + t) carry rounding errors of the composition, those are bounded by slack
+        shifted = self.compose(Polynomial([middle, 1])).multipliers
+        slack = 4 * len(self.multipliers) * 2.3e-16 * sum(abs(mul) * (abs(middle) + 1) ** i
+                                                          for i, mul in enumerate(self.multipliers))
+        taylor = _power_sum(shifted, x - middle) + Interval(-slack, slack)
+        return Interval(max(ret.low, taylor.low), min(ret.high, taylor.high))
+
+    def _serialize(self, writer):
+        return "poly", tuple(self.multipliers)
+
+    def value_and_slope(self, x: float):
+        """ Returns values of the polynomial and its derivative at x, computed in one Horner pass """
+        muls = self.multipliers
+        value = muls[-1]
+        slope = 0.
+        for i in range(len(muls) - 2, -1, -1):
+            slope = slope * x + value
+            value = value * x + muls[i]
+        return value, slope
+
+
+def _power_sum(multipliers, x: Interval) -> Interval:
+    """ Bounds sum of mul * x**i, each power is bounded on its own so even powers stay non negative """
+    ret = Interval(0.)
+    for i, mul in enumerate(multipliers):
+        if mul != 0:
+            ret = ret + mul * x ** i
+    return ret
+
+
+def _convolve(left, right) -> List[float]:
+    """ Returns coefficients of the product of two polynomials given by coefficients """
+    ret = [0.] * (len(left) + len(right) - 1)
+    for i, l in enumerate(left):
+        if l == 0:
+            continue
+        for j, r in enumerate(right):
+            ret[i + j] += l * r
+    return ret
+
 
 Polynomial.ONE = Polynomial([1])
 Polynomial.MINUS_ONE = Polynomial([-1])
@@ -95,6 +278,8 @@ Polynomial.XX = Polynomial([0, 0, 1])
 
 
 class Sin(ElementaryFunction):
+    ufunc = np.sin
+
     def __init__(self):
         super(Sin, self).__init__(sin)
 
@@ -105,8 +290,19 @@ class Sin(ElementaryFunction):
     def _derivative(self, variable):
         return Cos()
 
+    def _range(self, x):
+        return periodic_range(x, sin, pi / 2)
+
+    def _slope(self, x):
+        return cos(x)
+
+    def _batch_slope(self, x):
+        return np.cos(x)
+
 
 class Cos(ElementaryFunction):
+    ufunc = np.cos
+
     def __init__(self):
         super(Cos, self).__init__(cos)
 
@@ -117,8 +313,19 @@ class Cos(ElementaryFunction):
         mo = Polynomial([-1])
         return mo * Sin()
 
+    def _range(self, x):
+        return periodic_range(x, cos, 0.)
+
+    def _slope(self, x):
+        return -sin(x)
+
+    def _batch_slope(self, x):
+        return -np.sin(x)
+
 
 class Log(ElementaryFunction):
+    ufunc = np.log
+
     def __init__(self):
         super(Log, self).__init__(log)
 
@@ -132,8 +339,19 @@ class Log(ElementaryFunction):
         one = Polynomial([1])
         return one / x
 
+    def _range(self, x):
+        return log_range(x)
+
+    def _slope(self, x):
+        return 1 / x
+
+    def _batch_slope(self, x):
+        return 1 / x
+
 
 class Exp(ElementaryFunction):
+    ufunc = np.exp
+
     def __init__(self):
         super().__init__(exp)
 
@@ -143,13 +361,54 @@ class Exp(ElementaryFunction):
     def _derivative(self, variable):
         return self
 
+    def _range(self, x):
+        return exp_range(x)
+
+    def _slope(self, x):
+        return exp(x)
+
+    def _batch_slope(self, x):
+        return np.exp(x)
+
+
 class Erf(ElementaryFunction):
+    ufunc = np.vectorize(erf, otypes=[float])
+
     def __init__(self):
         super().__init__(erf)
 
     def _derivative(self, variable):
-        return Polynomial([1/(2*pi)])*(Exp() @ Polynomial([0,0,-0.5]))
+        return Polynomial([2 / sqrt(pi)]) * (Exp() @ Polynomial([0, 0, -1]))
+
+    def _range(self, x):
+        ret = x.monotone(erf)
+        return Interval(max(ret.low, -1.), min(ret.high, 1.))
+
+    def _slope(self, x):
+        return 2 / sqrt(pi) * exp(-x * x)
+
+    def _batch_slope(self, x):
+        return 2 / sqrt(pi) * np.exp(-x * x)
 
 class Abs(ElementaryFunction):
+    ufunc = np.abs
+
     def __init__(self):
-        super().__init__(abs)
\ No newline at end of file
+        super().__init__(abs)
+
+    def _range(self, x):
+        if x.low >= 0:
+            return x
+        if x.high <= 0:
+            return -x
+        return Interval(0., max(-x.low, x.high))
+
+    def _slope(self, x):
+        if x > 0:
+            return 1.
+        if x < 0:
+            return -1.
+        return 0.
+
+    def _batch_slope(self, x):
+        return np.sign(x)
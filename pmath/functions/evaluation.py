@@ -0,0 +1,76 @@
+"""
+
+    Alternative evaluation modes of MathFunction trees
+
+"""
+from typing import List
+
+import numpy as np
+
+from pmath.functions.base_function import MathFunction
+from pmath.functions.sharing import postorder
+
+
+class FunctionEvaluator:
+    """
+        Walks a function tree in some evaluation mode.
+        Every (node, inputs) pair is evaluated once, so on a shared tree (see MathFunction.shared)
+        every structurally distinct subtree is computed once.
+    """
+
+    def __init__(self):
+        self.memo = {}
+        self.warming = False
+
+    def evaluate(self, func: MathFunction, arguments: List):
+        """
+            Evaluates func at arguments
+            :param func: Node to evaluate
+            :param arguments: Inputs of the node, their type depends on the mode
+            :returns value of the node in this mode
+        """
+        key = (id(func), id(arguments))
+        try:
+            return self.memo[key][0]
+        except KeyError:
+            pass
+        if not self.warming:
+            # subtrees are evaluated bottom up first, so the recursion below stays shallow for deep trees
+            self.warming = True
+            try:
+                for node in postorder(func, lambda node: node._argument_children())[:-1]:
+                    self.evaluate(node, arguments)
+            finally:
+                self.warming = False
+        value = self._evaluate(func, arguments)
+        # func and arguments are kept alive so their ids can't be reused
+        self.memo[key] = (value, func, arguments)
+        return value
+
+    def _evaluate(self, func: MathFunction, arguments: List):
+        raise NotImplementedError("This method must be overridden")
+
+
+class BatchEvaluator(FunctionEvaluator):
+    """ Evaluates a tree over columns of points, one numpy array per input dimension """
+
+    def _evaluate(self, func: MathFunction, arguments: List):
+        return func._evaluate_batch(self, arguments)
+
+
+def evaluate_batch(func: MathFunction, points) -> np.ndarray:
+    """
+        Evaluates func at every row of points
+        :param func: Function to evaluate
+        :param points: (N, d) array like of points, (N,) is accepted for functions R->R
+        :returns (N,) array of values
+    """
+    points = np.asarray(points, dtype=float)
+    if points.ndim == 1:
+        points = points.reshape(-1, 1)
+    if points.shape[1] < func.input_dim():
+        raise ValueError('Points have fewer coordinates than function inputs')
+
+    columns = [points[:, i] for i in range(points.shape[1])]
+    values = BatchEvaluator().evaluate(func.shared(), columns)
+    return np.array(np.broadcast_to(values, (points.shape[0],)), dtype=float)
@@ -0,0 +1,210 @@
+"""
+
+    Interval arithmetic evaluation of MathFunction trees
+
+"""
+from math import ceil, exp, inf, isnan, log, nextafter, pi
+from typing import List
+
+from pmath.functions.base_function import MathFunction
+from pmath.functions.evaluation import FunctionEvaluator
+from pmath.util.hcuberegion import HCubeRegion
+
+
+def _power(x: float, n: float) -> float:
+    try:
+        return x ** n
+    except OverflowError:
+        return inf
+    except ZeroDivisionError:
+        return inf
+
+
+def _product(a: float, b: float) -> float:
+    """ Product of interval ends, zero times infinity is zero """
+    if a == 0 or b == 0:
+        return 0.
+    return a * b
+
+
+class Interval:
+    """
+        Closed interval [low, high] of reals. Arithmetic on intervals gives intervals containing every possible
+        result of the operation on their elements, ends of the results are rounded outwards.
+        Plain numbers are treated as degenerate intervals.
+    """
+    __slots__ = ("low", "high")
+
+    def __init__(self, low: float, high: float = None):
+        if high is None:
+            high = low
+        self.low = low
+        self.high = high
+
+    @staticmethod
+    def rounded(low: float, high: float) -> 'Interval':
+        """ Returns [low, high] widened by one ulp on both ends, whole line if some end is nan """
+        if isnan(low) or isnan(high):
+            return Interval.everything()
+        return Interval(nextafter(low, -inf), nextafter(high, inf))
+
+    @staticmethod
+    def everything() -> 'Interval':
+        return Interval(-inf, inf)
+
+    @staticmethod
+    def hull(*values: float) -> 'Interval':
+        """ Returns the smallest interval containing all values, rounded outwards """
+        return Interval.rounded(min(values), max(values))
+
+    def width(self) -> float:
+        return self.high - self.low
+
+    def mid(self) -> float:
+        return (self.low + self.high) / 2
+
+    def contains(self, value: float) -> bool:
+        return self.low <= value <= self.high
+
+    def monotone(self, func, increasing: bool = True) -> 'Interval':
+        """ Returns image of the interval under a monotone function """
+        low, high = func(self.low), func(self.high)
+        if increasing:
+            return Interval.rounded(low, high)
+        return Interval.rounded(high, low)
+
+    def __add__(self, other):
+        if isinstance(other, Interval):
+            return Interval.rounded(self.low + other.low, self.high + other.high)
+        return Interval.rounded(self.low + other, self.high + other)
+
+    def __radd__(self, other):
+        return self + other
+
+    def __sub__(self, other):
+        if isinstance(other, Interval):
+            return Interval.rounded(self.low - other.high, self.high - other.low)
+        return Interval.rounded(self.low - other, self.high - other)
+
+    def __rsub__(self, other):
+        return Interval.rounded(other - self.high, other - self.low)
+
+    def __mul__(self, other):
+        if not isinstance(other, Interval):
+            other = Interval(other)
+        return Interval.hull(_product(self.low, other.low), _product(self.low, other.high),
+                             _product(self.high, other.low), _product(self.high, other.high))
+
+    def __rmul__(self, other):
+        return self * other
+
+    def __truediv__(self, other):
+        if not isinstance(other, Interval):
+            other = Interval(other)
+        if other.low <= 0 <= other.high:
+            return Interval.everything()
+        return self * Interval.rounded(1 / other.high, 1 / other.low)
+
+    def __rtruediv__(self, other):
+        return Interval(other) / self
+
+    def __pow__(self, power, modulo=None):
+        if isinstance(power, Interval):
+            if power.low != power.high:
+                # a ** b is monotone in each argument for positive a, extremes are at the corners
+                if self.low <= 0:
+                    return Interval.everything()
+                return Interval.hull(_power(self.low, power.low), _power(self.low, power.high),
+                                     _power(self.high, power.low), _power(self.high, power.high))
+            power = power.low
+
+        if float(power).is_integer():
+            power = int(power)
+            if power == 0:
+                return Interval(1.)
+            if power < 0:
+                return (1 / self) ** -power
+            if power % 2 == 1 or self.low >= 0:
+                return self.monotone(lambda x: _power(x, power))
+            if self.high <= 0:
+                return self.monotone(lambda x: _power(x, power), False)
+            return Interval.rounded(0., max(_power(self.low, power), _power(self.high, power)))
+
+        # fractional powers are defined for non negative bases only
+        if self.high < 0:
+            return Interval.everything()
+        base = Interval(max(self.low, 0.), self.high)
+        return base.monotone(lambda x: _power(x, power), power > 0)
+
+    def __rpow__(self, other):
+        if other <= 0:
+            return Interval.everything()
+        return self.monotone(lambda x: _power(other, x), other >= 1)
+
+    def __neg__(self):
+        return Interval(-self.high, -self.low)
+
+    def __repr__(self):
+        return "Interval({}, {})".format(self.low, self.high)
+
+
+def exp_range(x: Interval) -> Interval:
+    def _exp(value):
+        try:
+            return exp(value)
+        except OverflowError:
+            return inf
+    ret = x.monotone(_exp)
+    return Interval(max(ret.low, 0.), ret.high)
+
+
+def log_range(x: Interval) -> Interval:
+    if x.high <= 0:
+        return Interval.everything()
+    return x.monotone(lambda value: log(value) if value > 0 else -inf)
+
+
+def periodic_range(x: Interval, func, peak: float) -> Interval:
+    """
+        Returns image of x under a 2pi periodic function with values in [-1, 1]
+        :param func: sin or cos
+        :param peak: point where func reaches 1, func reaches -1 at peak + pi
+    """
+    if x.width() >= 2 * pi or x.width() != x.width():
+        return Interval(-1., 1.)
+    ret = Interval.hull(func(x.low), func(x.high))
+    low, high = max(ret.low, -1.), min(ret.high, 1.)
+
+    # extremes close to the ends are included as well, that only makes the result wider
+    slack = 1e-12 * max(1., abs(x.low), abs(x.high))
+    top = peak + 2 * pi * ceil((x.low - peak) / (2 * pi) - 1)
+    while top <= x.high + slack:
+        if top >= x.low - slack:
+            high = 1.
+        if x.low - slack <= top + pi <= x.high + slack:
+            low = -1.
+        top += 2 * pi
+    return Interval(low, high)
+
+
+class IntervalEvaluator(FunctionEvaluator):
+    """ Evaluates a tree over intervals, giving bounds of the function over a box """
+
+    def _evaluate(self, func: MathFunction, arguments: List):
+        return func._evaluate_interval(self, arguments)
+
+
+def evaluate_interval(func: MathFunction, region: HCubeRegion) -> Interval:
+    """
+        Bounds func over region
+        :param func: Function to bound
+        :param region: Box to bound func over
+        :returns Interval containing every value of func over the region
+    """
+    arguments = [Interval(low, high) for low, high in region.ranges]
+    if len(arguments) < func.input_dim():
+        raise ValueError('Region has fewer dimensions than function inputs')
+    ret = IntervalEvaluator().evaluate(func.shared(), arguments)
+    if not isinstance(ret, Interval):
+        ret = Interval.hull(ret)
+    return ret
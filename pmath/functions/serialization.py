@@ -0,0 +1,154 @@
+"""
+
+    Compact versioned serialization of MathFunction trees
+
+"""
+import hashlib
+import os
+import pickle
+from typing import List
+
+from pmath.functions.base_function import MathFunction, FunctionComposiiton, FunctionSum, FunctionSubtraction, \
+    FunctionMultiplication, FunctionDivision, FunctionPower, Variable
+from pmath.functions.compiler import CompiledFunction
+from pmath.functions.elementary_functions import ElementaryFunction, Polynomial
+from pmath.functions.sharing import postorder
+
+FORMAT_VERSION = 1
+FORMAT_NAME = "pmath-function"
+
+
+class FunctionWriter:
+    """
+        Writes a tree as a list of instructions in post order. Every instruction fills the next slot,
+        operands of an instruction are slots of its children. Shared subtrees are written once.
+    """
+
+    def __init__(self):
+        self.slots = {}  # id(node) -> slot
+        self.instructions = []  # type: List[tuple]
+
+    def ref(self, node: MathFunction) -> int:
+        """ Returns slot of an already written node """
+        return self.slots[id(node)]
+
+    def write(self, func: MathFunction) -> int:
+        for node in postorder(func):
+            if id(node) not in self.slots:
+                self.instructions.append(node._serialize(self))
+                self.slots[id(node)] = len(self.instructions) - 1
+        return self.ref(func)
+
+
+def _elementary(name: str) -> ElementaryFunction:
+    stack = [ElementaryFunction]
+    while stack:
+        cls = stack.pop()
+        if cls.__name__ == name:
+            return cls()
+        stack.extend(cls.__subclasses__())
+    raise ValueError('Unknown elementary function: {}'.format(name))
+
+
+_readers = {
+    "object": lambda slots, node: node,
+    "poly": lambda slots, multipliers: Polynomial(multipliers),
+    "var": lambda slots, num, max, letter: Variable(num, max, letter),
+    "elem": lambda slots, name: _elementary(name),
+    "sum": lambda slots, f, g: FunctionSum(slots[f], slots[g]),
+    "sub": lambda slots, f, g: FunctionSubtraction(slots[f], slots[g]),
+    "mul": lambda slots, f, g: FunctionMultiplication(slots[f], slots[g]),
+    "div": lambda slots, f, g: FunctionDivision(slots[f], slots[g]),
+    "pow": lambda slots, f, g: FunctionPower(slots[f], slots[g]),
+    "compose": lambda slots, f, g: FunctionComposiiton(slots[f], slots[g]),
+    "compiled": lambda slots, source: slots[source].compile(),
+}
+
+
+class SerializedFunction:
+    """
+        Serialized MathFunction. Pickles as a plain versioned tuple of instructions,
+        the function is rebuilt (and compiled) on first use in every process.
+    """
+
+    def __init__(self, instructions: List[tuple], input_dim: int):
+        self.instructions = instructions
+        self.dim = input_dim
+        self.function = None  # rebuilt function, never pickled
+
+    def load(self) -> MathFunction:
+        """
+            Rebuilds the function, the result is cached
+            :returns MathFunction
+        """
+        if self.function is None:
+            slots = []
+            for opcode, *operands in self.instructions:
+                try:
+                    reader = _readers[opcode]
+                except KeyError:
+                    raise ValueError('Unknown instruction: {}'.format(opcode))
+                slots.append(reader(slots, *operands))
+            self.function = slots[-1]
+        return self.function
+
+    def compiled(self) -> MathFunction:
+        """ Returns the rebuilt function compiled, the result is cached """
+        function = self.load()
+        if not isinstance(function, CompiledFunction):
+            self.function = function = function.compile()
+        return function
+
+    def __call__(self, arguments: List[float]) -> float:
+        return self.compiled()(arguments)
+
+    def input_dim(self) -> int:
+        return self.dim
+
+    def digest(self) -> str:
+        """ Returns hash of the instructions, equal functions serialized the same way have equal digests """
+        return hashlib.sha1(pickle.dumps(self.__getstate__(), protocol=pickle.HIGHEST_PROTOCOL)).hexdigest()
+
+    def save(self, path: str):
+        """ Writes the function to path, the file is replaced atomically """
+        temporary = "{}.{}.tmp".format(path, os.getpid())
+        with open(temporary, "wb") as file:
+            pickle.dump(self, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, path)
+
+    @staticmethod
+    def read(path: str) -> 'SerializedFunction':
+        """
+            Reads function written by save
+            :raises ValueError if the file holds something else or an unsupported version
+        """
+        with open(path, "rb") as file:
+            ret = pickle.load(file)
+        if not isinstance(ret, SerializedFunction):
+            raise ValueError('{} does not hold a serialized function'.format(path))
+        return ret
+
+    def __getstate__(self):
+        return FORMAT_NAME, FORMAT_VERSION, self.dim, self.instructions
+
+    def __setstate__(self, state):
+        if len(state) < 2 or state[0] != FORMAT_NAME:
+            raise ValueError('Not a serialized function')
+        if state[1] != FORMAT_VERSION:
+            raise ValueError('Unsupported serialized function version: {}'.format(state[1]))
+        _, _, self.dim, self.instructions = state
+        self.function = None
+
+    def __len__(self):
+        return len(self.instructions)
+
+
+def serialize(func: MathFunction) -> SerializedFunction:
+    """
+        Serializes func, repeated subtrees are written once
+        :param func: Function to serialize
+        :returns SerializedFunction
+    """
+    writer = FunctionWriter()
+    writer.write(func.shared())
+    return SerializedFunction(writer.instructions, func.input_dim())
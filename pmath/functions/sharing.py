@@ -0,0 +1,136 @@
+"""
+
+    Structural hashing (hash-consing) of MathFunction trees
+
+"""
+from typing import List
+
+from pmath.functions.base_function import MathFunction
+
+
+class FunctionTable:
+    """
+        Hash-consing table. Structurally equal nodes are replaced with one canonical instance,
+        so a tree interned through the table becomes a DAG where every distinct subtree exists once.
+    """
+
+    def __init__(self):
+        self.nodes = {}  # structural key -> canonical node
+        self.seen = {}  # id(node) -> (node, canonical node)
+        self.partial = set()  # ids of canonical nodes still reaching nodes which aren't canonical
+
+    def key(self, func: MathFunction):
+        """
+            Returns structural key of func. Keys of two nodes are equal iff the nodes are structurally equal
+            :param func: Node
+            :returns hashable key
+        """
+        func = self.intern(func)
+        return type(func), func._structural_params(), tuple(id(child) for child in func.children())
+
+    def intern(self, func: MathFunction) -> MathFunction:
+        """
+            Returns canonical instance structurally equal to func, children of the result are canonical as well
+            :param func: Node to intern
+            :returns MathFunction
+        """
+        try:
+            return self.seen[id(func)][1]
+        except KeyError:
+            pass
+
+        for node in postorder(func, lambda node: [] if id(node) in self.seen else node.children()):
+            if id(node) not in self.seen:
+                self._intern_node(node)
+        return self.seen[id(func)][1]
+
+    def _intern_node(self, func: MathFunction):
+        """ Interns func, its children must be interned already """
+        children = func.children()
+        shared = [self.seen[id(child)][1] for child in children]
+        key = (type(func), func._structural_params(), tuple(id(child) for child in shared))
+        try:
+            canonical = self.nodes[key]
+        except KeyError:
+            canonical = func
+            for child, shared_child in zip(children, shared):
+                if child is not shared_child:
+                    canonical = func._rebuild(shared)
+                    break
+            self.nodes[key] = canonical
+            self.seen[id(canonical)] = (canonical, canonical)
+            # nodes which can't be rebuilt keep their original children
+            if not all(self.is_shared(child) for child in canonical.children()):
+                self.partial.add(id(canonical))
+
+        # func is kept alive so its id can't be reused by another node
+        self.seen[id(func)] = (func, canonical)
+
+    def is_shared(self, func: MathFunction) -> bool:
+        """
+            Tells whether func is a canonical node of the table and every node reachable from it is canonical too
+            :param func: Node
+            :returns bool
+        """
+        entry = self.seen.get(id(func))
+        return entry is not None and entry[1] is func and id(func) not in self.partial
+
+    def __len__(self):
+        return len(self.nodes)
+
+
+def postorder(func: MathFunction, children=None) -> List[MathFunction]:
+    """
+        Lists nodes reachable from func so that every node comes after its children.
+        The walk uses an explicit stack, so it works for trees deeper than the recursion limit.
+        :param func: Root
+        :param children: Function returning children to descend into, MathFunction.children by default
+        :returns List[MathFunction], func is the last element
+    """
+    if children is None:
+        children = lambda node: node.children()
+    order = []
+    seen = set()
+    stack = [(func, False)]
+    while stack:
+        node, expanded = stack.pop()
+        if expanded:
+            order.append(node)
+            continue
+        if id(node) in seen:
+            continue
+        seen.add(id(node))
+        stack.append((node, True))
+        for child in reversed(children(node)):
+            if id(child) not in seen:
+                stack.append((child, False))
+    return order
+
+
+def share(func: MathFunction, table: FunctionTable = None) -> MathFunction:
+    """
+        Returns func with every repeated subtree replaced by a single shared node
+        :param func: Function to share
+        :param table: Table to intern into, nodes already in the table are reused
+        :returns MathFunction
+    """
+    if table is None:
+        table = FunctionTable()
+    return table.intern(func)
+
+
+def count_nodes(func: MathFunction) -> int:
+    """
+        Counts distinct node objects reachable from func (size of the DAG, shared nodes count once)
+        :param func: Root
+        :returns int
+    """
+    seen = set()
+    stack = [func]
+    while stack:
+        node = stack.pop()
+        if id(node) in seen:
+            continue
+        seen.add(id(node))
+        stack.extend(node.children())
+    return len(seen)
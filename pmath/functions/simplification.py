@@ -0,0 +1,57 @@
+"""
+
+    Algebraic simplification of MathFunction trees
+
+"""
+from pmath.functions.base_function import MathFunction
+from pmath.functions.sharing import FunctionTable, postorder
+
+
+class Simplifier:
+    """
+        Simplifies a tree bottom up. Every node is rebuilt on top of its simplified children
+        and its _simplify rules are applied until none of them changes the node.
+    """
+
+    def __init__(self, table: FunctionTable = None):
+        if table is None:
+            table = FunctionTable()
+        self.table = table
+        self.done = {}
+
+    def simplify(self, func: MathFunction) -> MathFunction:
+        try:
+            return self.done[id(func)][1]
+        except KeyError:
+            pass
+        # subtrees are simplified bottom up first, so the recursion below stays shallow for deep trees
+        for node in postorder(func, lambda node: [] if id(node) in self.done else node.children())[:-1]:
+            if id(node) not in self.done:
+                self.simplify(node)
+
+        children = func.children()
+        simplified = [self.simplify(child) for child in children]
+        current = func
+        for child, simplified_child in zip(children, simplified):
+            if child is not simplified_child:
+                current = func._rebuild(simplified)
+                break
+        current = self.table.intern(current)
+
+        candidate = current._simplify()
+        if candidate is not current and self.table.intern(candidate) is not current:
+            current = self.simplify(candidate)
+
+        # func is kept alive so its id can't be reused by another node
+        self.done[id(func)] = (func, current)
+        return current
+
+
+def simplify(func: MathFunction, table: FunctionTable = None) -> MathFunction:
+    """
+        Returns algebraically simplified func, repeated subtrees of the result are shared
+        :param func: Function to simplify
+        :param table: Table to intern into, nodes already in the table are reused
+        :returns MathFunction
+    """
+    return Simplifier(table).simplify(func)
@@ -1,5 +1,7 @@
 from typing import List
 
+import numpy as np
+
 from pmath.functions.base_function import MathFunction, MathException
 from pmath.functions.elementary_functions import Polynomial
 from pmath.util.integrator import CallableIntegrator
@@ -17,11 +19,118 @@ class NDimGenerator(Generator):
         return list(generator.get() for generator in self.generators)
 
 
+class WeightedDistribution:
+    """
+    Weighted distribution over a fixed list of elements. Cumulative weights are built once, single elements
+    are drawn by binary search, batches with replacement from a Walker alias table built on first use.
+    """
+
+    def __init__(self, elements: List, weights, rng: np.random.Generator):
+        """
+        :param elements: Elements to draw, the list is not copied
+        :param weights: Non negative weight of every element
+        :param rng: Numpy generator of the draws
+        """
+        self.elements = elements
+        self.weights = np.asarray(weights, dtype=float).reshape(len(elements))
+        if np.any(self.weights < 0):
+            raise ValueError('Negative weight. Aborting')
+        self.cumulative = np.cumsum(self.weights)
+        self.total = float(self.cumulative[-1]) if len(self.cumulative) else 0.0
+        self.rng = rng
+        self.probability = None  # alias table, probability of keeping the drawn column
+        self.alias = None  # alias table, element taking the rest of the column
+
+    def __len__(self):
+        return len(self.elements)
+
+    def index(self, rand: float) -> int:
+        """ Returns index of the element at rand in [0, 1) of the cumulative weights """
+        return min(int(np.searchsorted(self.cumulative, rand * self.total)), len(self.elements) - 1)
+
+    def choose(self):
+        """ Returns random weighted element, None if there are no elements """
+        if not self.elements:
+            return None
+        return self.elements[self.index(self.rng.random())]
+
+    def build_alias(self):
+        """ Builds the alias table (Vose's method) """
+        count = len(self.weights)
+        scaled = self.weights * count / self.total if self.total > 0 else np.ones(count)
+        self.probability = np.ones(count)
+        self.alias = np.arange(count)
+        small = [i for i in range(count) if scaled[i] < 1]
+        large = [i for i in range(count) if scaled[i] >= 1]
+        while small and large:
+            less, more = small.pop(), large[-1]
+            self.probability[less] = scaled[less]
+            self.alias[less] = more
+            scaled[more] -= 1 - scaled[less]
+            if scaled[more] < 1:
+                small.append(large.pop())
+
+    def sample_indices(self, k: int, replace=True) -> np.ndarray:
+        """
+        Returns indices of k random weighted elements
+        :param replace: False draws distinct elements, in the order successive weighted draws would give
+        :raises ValueError if more distinct elements are wanted than there are
+        """
+        if not replace:
+            if k > len(self.elements):
+                raise ValueError('Sample larger than the population')
+            if 4 * k <= len(self.elements) and self.weights.max(initial=0) <= self.total / 2 and \
+                    np.count_nonzero(self.weights) >= k:
+                return self.distinct_indices(k)
+            # Efraimidis-Spirakis keys, elements of zero weight come last in list order
+            with np.errstate(divide="ignore"):
+                keys = np.where(self.weights > 0, np.log(1 - self.rng.random(len(self.weights))) / self.weights,
+                                -np.inf)
+            return np.argsort(-keys, kind="stable")[:k]
+        if k and not self.elements:
+            raise ValueError('Sample from an empty population')
+        if self.alias is None:
+            self.build_alias()
+        columns = self.rng.integers(len(self.elements), size=k)
+        keep = self.rng.random(k) < self.probability[columns]
+        return np.where(keep, columns, self.alias[columns])
+
+    def distinct_indices(self, k: int) -> np.ndarray:
+        """ Draws with replacement skipping repeated elements, cheap for samples much smaller than the population """
+        chosen = {}
+        while len(chosen) < k:
+            for i in self.sample_indices(2 * (k - len(chosen))).tolist():
+                chosen.setdefault(i)
+                if len(chosen) == k:
+                    break
+        return np.fromiter(chosen, dtype=int, count=k)
+
+    def sample(self, k: int, replace=True) -> List:
+        """ Returns list of k random weighted elements, see sample_indices """
+        return [self.elements[i] for i in self.sample_indices(k, replace)]
+
+
 class WeightedSelector:
     """ Utillity class for weighted selected random element from a list and random weighted population"""
 
     def __init__(self, uniform_generator=StdRealUniformGenerator()):
         self.generator = uniform_generator
+        self.rng = None  # numpy generator of batch draws, seeded from self.generator on first use
+
+    @staticmethod
+    def weights(l: List, key=None) -> np.ndarray:
+        if key is None:
+            return np.fromiter(l, dtype=float, count=len(l))
+        return np.fromiter((key(el) for el in l), dtype=float, count=len(l))
+
+    def distribution(self, l: List, key=None) -> WeightedDistribution:
+        """
+        Returns distribution over l for repeated draws, weights are computed once
+        :param key: This is a function that returns the weight of element. If key is none element is assesed as weight
+        """
+        if self.rng is None:
+            self.rng = np.random.default_rng(int(self.generator.get() * 2 ** 63))
+        return WeightedDistribution(l, self.weights(l, key), self.rng)
 
     def choose(self, l: List, key=None):
         """
@@ -30,34 +139,22 @@ class WeightedSelector:
         :param key: This is a function that returns the weight of element. If key is none element is assesed as weight
         :return: Random weighted element from list
         """
-        weighted = []
-        sum = 0
-        for el in l:
-            weight = el
-            if key is not None:
-                weight = key(el)
-            if weight < 0:
-                raise ValueError('Negative weight. Aborting')
-            sum += weight
-            weighted.append((sum, el))
-
-        rand = self.generator.get() * sum
-        # print("rand:", rand)
-        # print("sum:", sum)
-        for el in weighted:
-            #print(el[0])
-            if el[0] >= rand:
-                return el[1]
-
+        if not l:
+            return None
+        weights = self.weights(l, key)
+        if np.any(weights < 0):
+            raise ValueError('Negative weight. Aborting')
+        cumulative = np.cumsum(weights)
+        index = np.searchsorted(cumulative, self.generator.get() * cumulative[-1])
+        return l[min(int(index), len(l) - 1)]
 
     def population(self, l: List, k: int, key=None):
-        ret = []
-        l = l.copy()
-        for i in range(k):
-            obj = self.choose(l, key)
-            l.remove(obj)
-            ret.append(obj)
-        return ret
+        """ Selects k distinct random weighted elements, like k weighted draws each removing the drawn element """
+        return self.distribution(l, key).sample(k, replace=False)
+
+    def sample(self, l: List, k: int, key=None, replace=True):
+        """ Selects k random weighted elements, with replacement unless replace is False """
+        return self.distribution(l, key).sample(k, replace)
 
 
 class InverseCDFGenerator(Generator):
@@ -59,6 +59,19 @@ class HCubeRegion(Region):
         ret.append(HCubeRegion(low, high))
         return ret
 
+    def widest_split(self):
+        """ Splits the hcube in halves across its widest edge """
+        widest_edge = max(range(self.dimensions()), key=lambda i: self.ranges[i][1] - self.ranges[i][0])
+
+        low = [l[0] for l in self.ranges]
+        high = [h[1] for h in self.ranges]
+        mid = (low[widest_edge] + high[widest_edge]) / 2
+        left_high = list(high)
+        left_high[widest_edge] = mid
+        right_low = list(low)
+        right_low[widest_edge] = mid
+        return [HCubeRegion(low, left_high), HCubeRegion(right_low, high)]
+
     def split(self):
         """ This doesnt yet divide into 2^dim hcubes """
         return self.random_split()
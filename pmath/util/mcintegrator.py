@@ -17,18 +17,13 @@ class BasicMonteCarloIntegrator(Integrator):
         self.estim_std = 0
         if not self.preserve_mean:
             self.mean = 0
-            sum = 0
-            for i in range(1000):
-                sum += func(bounds.get_random_point())
-            self.mean = sum / 1000
+            values = func.evaluate_batch([bounds.get_random_point() for i in range(1000)])
+            self.mean = values.sum() / 1000
 
         for i in range(self.thousands - 1):
-            local_std = 0
-            local_mean = 0
-            for j in range(1000):
-                value = func(bounds.get_random_point())
-                local_mean += value
-                local_std += (self.mean - value) ** 2
+            values = func.evaluate_batch([bounds.get_random_point() for j in range(1000)])
+            local_mean = values.sum()
+            local_std = ((self.mean - values) ** 2).sum()
             self.mean *= (i + 1) / (i + 2)
             self.mean += local_mean / (1000 * (i + 2))
             self.estim_std += local_std
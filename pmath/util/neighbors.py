@@ -0,0 +1,76 @@
+from itertools import product
+
+import numpy as np
+
+
+class UniformGrid:
+    """
+    Uniform grid of cubic cells over a set of points, answers radius queries without comparing all pairs.
+    Only the first few coordinates are hashed, so the number of cells visited per query stays bounded
+    in high dimensions, candidates are filtered by their exact distance.
+    """
+
+    hashed_dims = 3  # highest number of leading coordinates used to place points into cells
+
+    def __init__(self, points, cell_size: float):
+        """
+        :param points: (n, d) array of points, it is not copied
+        :param cell_size: Edge of the cells, queries with radius up to cell_size visit adjacent cells only
+        """
+        if cell_size <= 0:
+            raise ValueError('Cell size has to be positive')
+        self.points = np.asarray(points, dtype=float)
+        self.cell_size = cell_size
+
+        keys = np.floor(self.points[:, :self.hashed_dims] / cell_size).astype(np.int64)
+        low = keys.min(axis=0, initial=0) - 1
+        extents = keys.max(axis=0, initial=0) - low + 2
+        # cells are numbered by their position in the bounding box, so the numbers have to fit int64
+        while len(extents) > 1 and np.prod(extents.astype(float)) > 2 ** 62:
+            keys, low, extents = keys[:, :-1], low[:-1], extents[:-1]
+        self.strides = np.cumprod(np.concatenate([[1], extents[:-1]]))
+        self.keys = (keys - low) @ self.strides  # cell number of every point
+
+        self.cells, inverse, counts = np.unique(self.keys, return_inverse=True, return_counts=True)
+        self.order = np.argsort(inverse.ravel(), kind="stable")  # point indices grouped by cell
+        self.counts = counts
+        self.starts = np.cumsum(counts) - counts
+        self.offsets = np.array(list(product((-1, 0, 1), repeat=len(extents)))) @ self.strides
+
+    def candidates(self, offset: int):
+        """
+        Returns pairs of points lying in cells shifted by offset from each other
+        :param offset: Difference of the cell numbers
+        :return: Arrays of sources and targets of the pairs
+        """
+        wanted = self.keys + offset
+        cells = np.minimum(np.searchsorted(self.cells, wanted), len(self.cells) - 1)
+        sources = np.flatnonzero(self.cells[cells] == wanted)
+        cells = cells[sources]
+        counts = self.counts[cells]
+        sources = np.repeat(sources, counts)
+        # position of every pair inside its group of targets
+        within = np.arange(len(sources)) - np.repeat(np.cumsum(counts) - counts, counts)
+        return sources, self.order[np.repeat(self.starts[cells], counts) + within]
+
+    def pairs_within(self, radii):
+        """
+        Returns all pairs (i, j) with |points[j] - points[i]| <= radii[i], including (i, i)
+        :param radii: Radius of every point or one radius for all, at most cell_size
+        :return: Arrays i and j sorted by i, and the distances of the pairs
+        """
+        radii = np.broadcast_to(np.asarray(radii, dtype=float), len(self.points))
+        if np.any(radii > self.cell_size):
+            raise ValueError('Query radius larger than the cell size')
+        sources, targets, distances = [np.empty(0, dtype=int)], [np.empty(0, dtype=int)], [np.empty(0)]
+        for offset in self.offsets:
+            i, j = self.candidates(offset)
+            diff = self.points[j] - self.points[i]
+            dist = np.sqrt(np.einsum("ij,ij->i", diff, diff))
+            close = dist <= radii[i]
+            sources.append(i[close])
+            targets.append(j[close])
+            distances.append(dist[close])
+        sources, targets, distances = np.concatenate(sources), np.concatenate(targets), np.concatenate(distances)
+        order = np.argsort(sources, kind="stable")
+        return sources[order], targets[order], distances[order]
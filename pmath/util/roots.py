@@ -31,24 +31,20 @@ class NewtonMethod(RootFinder):
             region = HCubeRegion((0,)*func.input_dim(), (1,)*func.input_dim())
 
         start = region.get_random_point()
-        derivative = func.derivative()
-        value = func(start)
-        print(derivative)
         print(func)
-        dvalue = derivative(start)
+        value, gradient = func.value_and_grad(start)
 
         step = 0
         while abs(value) > self.precision or self.fail_step == step:
             print(value)
             # todo: replace array/tuple with vector class
-            for i in range(func.input_dim()):
-                # todo: this only works in r^1. Fix with partial deriviation
-                try:
-                    start[i] -= value / dvalue
-                except (ZeroDivisionError, OverflowError):
-                    start = region.get_random_point()
-            value = func(start)
-            dvalue = derivative(start)
-            #print(value, dvalue)
+            # minimum norm newton step x -= f(x) * grad / |grad|^2, in r^1 this is x -= f(x) / f'(x)
+            try:
+                scale = value / sum(d * d for d in gradient)
+                for i in range(func.input_dim()):
+                    start[i] -= scale * gradient[i]
+            except (ZeroDivisionError, OverflowError):
+                start = region.get_random_point()
+            value, gradient = func.value_and_grad(start)
             step += 1
         return start
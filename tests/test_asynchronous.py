@@ -0,0 +1,43 @@
+import asyncio
+
+from optimization.asynchronous import AsyncOptimizationMethod
+from optimization.pso import ParticleSwarmOptimization
+from optimization.trajectory import MemorySink
+from pmath.util.hcuberegion import HCubeRegion
+
+
+class AsyncSwarm(AsyncOptimizationMethod, ParticleSwarmOptimization):
+    pass
+
+
+async def sphere(agent):
+    await asyncio.sleep(0)
+    return agent[0] ** 2 + agent[1] ** 2
+
+
+def swarm():
+    method = AsyncSwarm(region=HCubeRegion([-3, -3], [3, 3])).set_async_evaluation(4)
+    method.set_fitness_function(sphere, input_dim=2)
+    method.init_population(gen_count=8)
+    method.set_iteration_limit(3)
+    return method
+
+
+def test_start_records_to_sink():
+    method, sink = swarm(), MemorySink()
+    try:
+        method.start(sink=sink)
+    finally:
+        method.close()
+    assert [stats["iteration"] for stats in sink.stats] == [0, 1, 2, 3]
+    assert all(len(frame) == 8 for frame in sink.frames)
+
+
+def test_start_async_records_to_sink():
+    method, sink = swarm(), MemorySink()
+    try:
+        asyncio.run(method.start_async(sink=sink))
+    finally:
+        method.close()
+    assert [stats["iteration"] for stats in sink.stats] == [0, 1, 2, 3]
+    assert all(len(frame) == 8 for frame in sink.frames)
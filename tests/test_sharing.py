@@ -0,0 +1,41 @@
+from pmath.functions.base_function import MathFunction, Variables
+from pmath.functions.caching import CachedFunction
+from pmath.functions.elementary_functions import Cos
+from pmath.functions.sharing import count_nodes
+
+
+def test_shared_inside_cached_function():
+    x, y = Variables().get(2)
+    func = CachedFunction((Cos() @ (x * y)) + (Cos() @ (x * y)))
+    shared = func.shared()
+    first, second = shared.children()[0].children()
+    assert first is second
+    assert count_nodes(shared) < count_nodes(func)
+    assert shared([0.5, 2.0]) == func([0.5, 2.0])
+
+
+def test_shared_subtrees_of_cached_function():
+    x, y = Variables().get(2)
+    total = (Cos() @ (x * y)) + (Cos() @ (x * y))
+    CachedFunction(total).shared()
+    first, second = total.shared().children()
+    assert first is second
+
+
+class Wrapper(MathFunction):
+    """ Node which can't be rebuilt on top of other children """
+
+    def __init__(self, source):
+        self.source = source
+        super().__init__()
+
+    def children(self):
+        return [self.source]
+
+
+def test_shared_below_node_without_rebuild():
+    x, y = Variables().get(2)
+    total = (Cos() @ (x * y)) + (Cos() @ (x * y))
+    assert Wrapper(total).shared().source is total
+    first, second = total.shared().children()
+    assert first is second